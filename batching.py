@@ -0,0 +1,102 @@
+"""Grouping of changed files into review batches"""
+
+from config import MAX_BATCH_CHARS, MAX_BATCH_FILES
+
+
+class Batcher:
+    """
+    增量分批器：逐一加入檔案，批次一滿就立即產出
+
+    create_batches 與 pipeline 模式共用同一套規則，因此兩者對同一份 diff
+    會產生完全相同的批次。
+    """
+
+    def __init__(self, max_chars: int = MAX_BATCH_CHARS, max_files: int = MAX_BATCH_FILES):
+        """
+        初始化分批器
+
+        Args:
+            max_chars: 單一批次最大字元數
+            max_files: 單一批次最大檔案數
+        """
+        self.max_chars = max_chars
+        self.max_files = max_files
+        self.current_batch = []
+        self.current_batch_size = 0
+
+    def add(self, file_info: dict) -> list:
+        """
+        加入一個檔案
+
+        Args:
+            file_info: 檔案資訊（file_path, diff）
+
+        Returns:
+            list: 因此完成的批次（可能為空）
+        """
+        completed = []
+        diff_size = diff_size_of(file_info)
+
+        # 如果單個檔案超過批次限制，單獨處理
+        if diff_size > self.max_chars:
+            if self.current_batch:
+                completed.append(self.current_batch)
+                self.current_batch = []
+                self.current_batch_size = 0
+            completed.append([file_info])
+        # 如果加入當前批次會超過限制，開始新批次
+        elif (self.current_batch_size + diff_size > self.max_chars or
+              len(self.current_batch) >= self.max_files):
+            completed.append(self.current_batch)
+            self.current_batch = [file_info]
+            self.current_batch_size = diff_size
+        # 加入當前批次
+        else:
+            self.current_batch.append(file_info)
+            self.current_batch_size += diff_size
+
+        return completed
+
+    def flush(self) -> list:
+        """
+        取出最後一個未滿的批次
+
+        Returns:
+            list: 剩餘的批次（可能為空）
+        """
+        if not self.current_batch:
+            return []
+        batch = self.current_batch
+        self.current_batch = []
+        self.current_batch_size = 0
+        return [batch]
+
+
+def diff_size_of(file_info: dict) -> int:
+    """
+    回傳檔案 diff 的字元數
+
+    低記憶體模式的 file_info 帶有 diff_chars，不必為了量長度而讀出整段 diff。
+    """
+    if "diff_chars" in file_info:
+        return file_info["diff_chars"]
+    return len(file_info['diff'])
+
+
+def create_batches(files, limits: tuple = None) -> list:
+    """
+    將檔案分組為批次
+
+    Args:
+        files: 檔案列表
+        limits: (max_chars, max_files)；None 則使用 MAX_BATCH_CHARS / MAX_BATCH_FILES
+
+    Returns:
+        list: 批次列表
+    """
+    batcher = Batcher(*limits) if limits else Batcher()
+    batches = []
+    for file_info in files:
+        batches.extend(batcher.add(file_info))
+    batches.extend(batcher.flush())
+    return batches
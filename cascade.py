@@ -0,0 +1,115 @@
+"""Two-tier model cascade: cheap triage before deep review"""
+
+from batching import create_batches, diff_size_of
+from config import CASCADE_THRESHOLD
+from llm.pricing import estimate_tokens, estimate_cost, format_cost
+from prompts import build_triage_prompt, build_review_prompt, build_batch_diff
+
+
+def triage_batches(batches: list, mr_data: dict, triage_client) -> list:
+    """
+    用便宜模型為每個檔案評分，回傳需要深度審查的檔案
+
+    評分低於 CASCADE_THRESHOLD 的檔案會被略過；初篩回應中缺少或無法解析的檔案
+    一律升級，避免漏審。
+
+    Args:
+        batches: create_batches 產生的批次
+        mr_data: MR 資訊（需要 title）
+        triage_client: 初篩用的 LLM 客戶端
+
+    Returns:
+        list: 需要送 AI_MODEL 深度審查的檔案（保持原始順序）
+    """
+    escalated = []
+
+    for batch_idx, batch in enumerate(batches, 1):
+        print(f"\n[初篩 {batch_idx}/{len(batches)}] 正在評分 {len(batch)} 個檔案")
+        file_info, diff_content = build_batch_diff(batch)
+        prompt = build_triage_prompt(mr_data['title'], file_info, diff_content)
+        results = triage_client.review_code(prompt)
+        escalated.extend(select_escalated(batch, results))
+
+    return escalated
+
+
+def select_escalated(batch: list, results: list) -> list:
+    """
+    依初篩回應挑出需要深度審查的檔案
+
+    Args:
+        batch: 送去初篩的檔案
+        results: 初篩模型回傳的 [{file_path, score}, ...]
+
+    Returns:
+        list: 需要深度審查的檔案
+    """
+    scores = {}
+    for item in results if isinstance(results, list) else []:
+        if isinstance(item, dict) and item.get('file_path'):
+            scores[item['file_path']] = _to_score(item.get('score'))
+
+    escalated = []
+    for fd in batch:
+        score = scores.get(fd['file_path'])
+        if score is None or score >= CASCADE_THRESHOLD:
+            escalated.append(fd)
+            print(f"  ⬆️ {fd['file_path']} (score: {score if score is not None else '未知'})")
+        else:
+            print(f"  ⏭️ {fd['file_path']} (score: {score})")
+    return escalated
+
+
+def print_cascade_report(mr_data: dict, escalated: list, triage_client, deep_client):
+    """
+    輸出 cascade 統計：升級檔案數、實際花費與估計節省的 LLM 呼叫時間/成本
+
+    時間為各次呼叫耗時的加總（累計呼叫時間）；pipeline 模式下呼叫會並行，
+    實際縮短的總耗時會小於此值。
+
+    Args:
+        mr_data: MR 資訊（需要 title、description、files）
+        escalated: 升級至深度審查的檔案
+        triage_client: 初篩用的 MeteredClient
+        deep_client: 深度審查用的 MeteredClient
+    """
+    files = mr_data['files']
+    escalated_paths = {fd['file_path'] for fd in escalated}
+    skipped = [fd for fd in files if fd['file_path'] not in escalated_paths]
+    escalated_chars = sum(diff_size_of(fd) for fd in escalated)
+    skipped_chars = sum(diff_size_of(fd) for fd in skipped)
+
+    # 以實際深度審查的數據推估被略過檔案的成本與耗時
+    prompt_overhead = len(build_review_prompt(mr_data['title'], mr_data['description'], "", ""))
+    skipped_batches = len(create_batches(skipped))
+    skipped_input_tokens = estimate_tokens(skipped_chars + prompt_overhead * skipped_batches)
+    output_per_file = deep_client.output_tokens / len(escalated) if escalated else 0
+    saved_cost = estimate_cost(deep_client.model, skipped_input_tokens, int(output_per_file * len(skipped)))
+    saved_seconds = deep_client.seconds / escalated_chars * skipped_chars if escalated_chars else None
+
+    triage_cost = triage_client.cost
+    net_saved = saved_cost - triage_cost if saved_cost is not None and triage_cost is not None else None
+
+    print("\n" + "=" * 80)
+    print("Cascade 統計")
+    print("=" * 80)
+    print(f"升級深度審查: {len(escalated)}/{len(files)} 個檔案（略過 {len(skipped)} 個）")
+    print(f"初篩 ({triage_client.model}): {triage_client.calls} 次呼叫, "
+          f"累計呼叫時間 {triage_client.seconds:.1f}s, {format_cost(triage_cost)}")
+    print(f"深度審查 ({deep_client.model}): {deep_client.calls} 次呼叫, "
+          f"累計呼叫時間 {deep_client.seconds:.1f}s, {format_cost(deep_client.cost)}")
+    if saved_seconds is not None:
+        print(f"估計節省累計呼叫時間: {saved_seconds - triage_client.seconds:.1f}s"
+              f"（已扣除初篩耗時；並行時實際縮短的總耗時較少）")
+    else:
+        print("估計節省累計呼叫時間: 未知（無深度審查資料可推估）")
+    print(f"估計節省成本: {format_cost(net_saved)}（已扣除初篩成本）")
+    print("=" * 80)
+
+
+def _to_score(value):
+    """將初篩分數轉為整數，無法解析時回傳 None"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -17,14 +17,63 @@ GITLAB_TOKEN = os.getenv("GITLAB_TOKEN")
 AI_ACCESS_KEY = os.getenv("AI_ACCESS_KEY")
 AI_MODEL = os.getenv("AI_MODEL", "gpt-4o-mini")
 
+# OpenAI 相容服務（自架 vLLM / llama.cpp 等），留空則使用 OpenAI 官方 API
+AI_BASE_URL = os.getenv("AI_BASE_URL", "").rstrip("/")
+SELF_HOSTED = bool(AI_BASE_URL)
+# responses: OpenAI Responses API；chat: Chat Completions API
+# 留空則自動判斷：有設定 base URL 時用 chat，否則用 responses
+AI_API_MODE = os.getenv("AI_API_MODE", "").lower()
+AI_MAX_TOKENS = int(os.getenv("AI_MAX_TOKENS", "0"))
+# 自架服務無排隊與速率限制，但單次生成可能較慢，預設給較長的逾時
+AI_TIMEOUT = int(os.getenv("AI_TIMEOUT", "300" if SELF_HOSTED else "120"))
+
 # General Settings
 POST_COMMENT = os.getenv("POST_COMMENT", "true").lower() == "true"
 
+# Superseded Run Settings（MR 有新 commit 時中止舊的審查，只讓最新的執行發佈評論）
+# merged results pipeline 的 CI_COMMIT_SHA 是合併 commit，需優先使用 source branch SHA
+RUN_SHA = os.getenv("CI_MERGE_REQUEST_SOURCE_BRANCH_SHA") or os.getenv("CI_COMMIT_SHA", "")
+SUPERSEDE_CHECK = os.getenv("SUPERSEDE_CHECK", "true").lower() == "true"
+SUPERSEDE_CHECK_INTERVAL = int(os.getenv("SUPERSEDE_CHECK_INTERVAL", "30"))
+
 # Batch Processing Settings
 MAX_DIFF_CHARS = int(os.getenv("MAX_DIFF_CHARS", "12000"))
 MAX_BATCH_CHARS = int(os.getenv("MAX_BATCH_CHARS", "40000"))
 MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "8"))
 
+# Batch Tuning Settings（記錄每個批次的大小、耗時與解析結果；AUTO_BATCH_SIZE 依紀錄自動決定批次上限）
+BATCH_HISTORY_FILE = os.getenv("BATCH_HISTORY_FILE", "")
+AUTO_BATCH_SIZE = os.getenv("AUTO_BATCH_SIZE", "false").lower() == "true"
+
+# Pipeline Settings（asyncio 串流模式：邊下載 diff 邊分批邊審查）
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "false").lower() == "true"
+# 自架服務可批次推論（continuous batching），預設提高並行數
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "16" if SELF_HOSTED else "4"))
+DIFF_PAGE_SIZE = int(os.getenv("DIFF_PAGE_SIZE", "20"))
+
+# Low Memory Settings（diff 暫存至磁碟、問題逐批寫出，適用上千檔案的 MR）
+LOW_MEMORY = os.getenv("LOW_MEMORY", "false").lower() == "true"
+
+# Cascade Settings（便宜模型初篩，僅標記的檔案送 AI_MODEL 深度審查；留空則停用）
+CASCADE_MODEL = os.getenv("CASCADE_MODEL", "")
+CASCADE_ACCESS_KEY = os.getenv("CASCADE_ACCESS_KEY") or AI_ACCESS_KEY
+CASCADE_BASE_URL = os.getenv("CASCADE_BASE_URL", "").rstrip("/")
+CASCADE_THRESHOLD = int(os.getenv("CASCADE_THRESHOLD", "5"))
+
+# Shard Settings（GitLab parallel:，CI_NODE_TOTAL > 1 時各 job 只審查部分批次）
+NODE_INDEX = int(os.getenv("CI_NODE_INDEX", "1"))
+NODE_TOTAL = int(os.getenv("CI_NODE_TOTAL", "1"))
+SHARD_DIR = os.getenv("SHARD_DIR", "review-shards")
+
+# Sweep Settings（--sweep 審查專案中所有開啟中的 MR；token 預算 0 表示不限制）
+SWEEP_TOKEN_BUDGET = int(os.getenv("SWEEP_TOKEN_BUDGET", "0"))
+
+# Note Settings（GitLab 單則評論上限為 1,000,000 字元，超過時分成多則評論）
+MAX_NOTE_CHARS = int(os.getenv("MAX_NOTE_CHARS", "1000000"))
+
+# Review Cache Settings（保存上次審查的 hunk 與問題，rebase 後只重審新增或修改的 hunk；留空則停用）
+REVIEW_CACHE_DIR = os.getenv("REVIEW_CACHE_DIR", "")
+
 # File Filtering
 FILE_PATTERN = os.getenv("FILE_PATTERN", r"^src/.*\.cs$")
 
@@ -58,7 +107,8 @@ def validate_config(skip_ai_key: bool = False):
         "PROJECT_ID": PROJECT_ID,
         "GITLAB_TOKEN": GITLAB_TOKEN,
     }
-    if not skip_ai_key:
+    # 自架服務通常不需要 API 金鑰
+    if not skip_ai_key and not SELF_HOSTED:
         mandatory["AI_ACCESS_KEY"] = AI_ACCESS_KEY
 
     missing = [name for name, value in mandatory.items() if not value]
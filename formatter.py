@@ -1,63 +1,137 @@
 """Output formatting utilities for review results"""
 
 from config import SERVER_URL
+from spool import IssueSpool
 
 
-def format_review_output(all_issues: list, project_path: str, source_branch: str) -> str:
+# 影響程度的輸出順序；其他值排在最後
+IMPACT_ORDER = ('高', '中', '低')
+IMPACT_ICONS = {'高': '🔴', '中': '🟡', '低': '⚪'}
+
+NO_ISSUES_TEXT = "✅ **審查完成，未發現任何問題**\n\n所有檔案都通過了程式碼審查。"
+CONTINUED_HEADER = "**問題列表（續）**"
+DETAILS_SEPARATOR = "\n---\n\n"
+TRUNCATED_SUFFIX = "\n\n... (內容過長，已截斷)\n"
+
+
+def format_review_output(all_issues, project_path: str, source_branch: str) -> str:
     """
-    將審查結果格式化為 Markdown
+    將審查結果格式化為 Markdown（單一評論，不分割）
     
     Args:
-        all_issues: 問題列表
+        all_issues: 問題列表（list 或 IssueSpool）
         project_path: GitLab 專案路徑
         source_branch: 來源分支
     
     Returns:
         str: 格式化的 Markdown 文字
     """
-    if not all_issues:
-        return "✅ **審查完成，未發現任何問題**\n\n所有檔案都通過了程式碼審查。"
+    return next(iter_review_notes(all_issues, project_path, source_branch))
+
+
+def iter_review_notes(all_issues, project_path: str, source_branch: str, max_chars: int = 0):
+    """
+    依影響程度逐段產生審查結果 Markdown，超過長度上限時分成多則評論
     
-    # 按照影響程度排序：高 -> 中 -> 低
-    impact_order = {'高': 0, '中': 1, '低': 2}
-    all_issues.sort(key=lambda x: impact_order.get(x.get('impact', '未知'), 999))
+    問題只走訪一次並依影響程度放入桶中（不排序整個列表，也不修改傳入的列表）；
+    IssueSpool 的桶同樣寫入暫存檔，記憶體用量與問題總數無關，只與單則評論大小有關。
+    每則評論都有自己的表格與詳情區塊，可獨立閱讀。
+    
+    Args:
+        all_issues: 問題列表（list 或 IssueSpool）
+        project_path: GitLab 專案路徑
+        source_branch: 來源分支
+        max_chars: 單則評論的最大字元數，0 表示不分割
+    
+    Yields:
+        str: 每則評論的 Markdown 文字
+    """
+    buckets, impact_count = _bucket_by_impact(all_issues)
+    try:
+        total = sum(len(bucket) for bucket in buckets)
+        if total == 0:
+            yield NO_ISSUES_TEXT
+            return
+
+        # 生成摘要標題
+        header = f"**發現 {total} 個問題**"
+        if impact_count['高'] > 0 or impact_count['中'] > 0 or impact_count['低'] > 0:
+            header += f" (高: {impact_count['高']}, 中: {impact_count['中']}, 低: {impact_count['低']})"
+
+        frame_chars = len(_render_note("", [], []))
+        rows, details, size = [], [], 0
+        idx = 0
+        for bucket in buckets:
+            for issue in bucket:
+                idx += 1
+                row, detail = _render_issue(idx, issue, project_path, source_branch)
+                added = len(row) + 1 + len(detail) + len(DETAILS_SEPARATOR)
+                if max_chars:
+                    if rows and len(header) + frame_chars + size + added > max_chars:
+                        yield _render_note(header, rows, details)
+                        header = CONTINUED_HEADER
+                        rows, details, size = [], [], 0
+                    # 單一問題本身就超過上限時截斷詳情
+                    room = max_chars - len(header) - frame_chars - len(row) - 1 - len(TRUNCATED_SUFFIX)
+                    if len(detail) > room:
+                        detail = detail[:max(room, 0)] + TRUNCATED_SUFFIX
+                        added = len(row) + 1 + len(detail) + len(DETAILS_SEPARATOR)
+                rows.append(row)
+                details.append(detail)
+                size += added
+        yield _render_note(header, rows, details)
+    finally:
+        for bucket in buckets:
+            if hasattr(bucket, "close"):
+                bucket.close()
+
 
-    # 統計影響程度
-    impact_count = {'高': 0, '中': 0, '低': 0}
+def _bucket_by_impact(all_issues):
+    """
+    將問題依影響程度分桶（高 -> 中 -> 低 -> 其他），桶內維持原本順序
+    
+    Returns:
+        tuple: (buckets, impact_count)
+    """
+    make_bucket = IssueSpool if isinstance(all_issues, IssueSpool) else list
+    buckets = [make_bucket() for _ in range(len(IMPACT_ORDER) + 1)]
+    impact_count = {impact: 0 for impact in IMPACT_ORDER}
     for issue in all_issues:
         impact = issue.get('impact', '未知')
         if impact in impact_count:
             impact_count[impact] += 1
+            buckets[IMPACT_ORDER.index(impact)].extend([issue])
+        else:
+            buckets[-1].extend([issue])
+    return buckets, impact_count
 
-    # 生成摘要標題
-    summary_header = f"**發現 {len(all_issues)} 個問題**"
-    if impact_count['高'] > 0 or impact_count['中'] > 0 or impact_count['低'] > 0:
-        summary_header += f" (高: {impact_count['高']}, 中: {impact_count['中']}, 低: {impact_count['低']})"
+
+def _render_issue(idx: int, issue: dict, project_path: str, source_branch: str) -> tuple:
+    """
+    產生單一問題的表格行與詳情段落
+    
+    Returns:
+        tuple: (table_row, detail_section)
+    """
+    # 提取欄位
+    category = issue.get('category', '未分類')
+    summary = issue.get('summary', issue.get('problem', '')[:30] + '...')
+    problem = issue.get('problem', '')
+    line_range = issue.get('line_range', '')
+    impact = issue.get('impact', '未知')
+    suggestion = issue.get('suggestion', '')
+    file_path = issue.get('file_path', '')
     
-    # 生成表格和詳情
-    table_rows = [summary_header, "", "| 影響 | 檔案 | 種類 | 摘要 |", "| --- | --- | --- | --- |"]
-    details_sections = []
+    # 建立檔案連結
+    location = _build_file_link(project_path, source_branch, file_path, line_range)
     
-    for idx, issue in enumerate(all_issues, 1):
-        # 提取欄位
-        category = issue.get('category', '未分類')
-        summary = issue.get('summary', issue.get('problem', '')[:30] + '...')
-        problem = issue.get('problem', '')
-        line_range = issue.get('line_range', '')
-        impact = issue.get('impact', '未知')
-        suggestion = issue.get('suggestion', '')
-        file_path = issue.get('file_path', '')
-        
-        # 建立檔案連結
-        location = _build_file_link(project_path, source_branch, file_path, line_range)
-        
-        # 表格行：只顯示摘要
-        summary_text = summary.replace('|', '\\|').replace('\n', ' ')
-        table_rows.append(f"| {impact} | {location} | {category} | {summary_text} |")
-        
-        # 詳細資訊：完整問題和建議
-        impact_icon = {'高': '🔴', '中': '🟡', '低': '⚪'}.get(impact, '🔵')
-        detail_section = f"""### {impact_icon} 問題 {idx} - {file_path} ({category}/{impact})
+    # 表格行：只顯示摘要
+    summary_text = summary.replace('|', '\\|').replace('\n', ' ')
+    table_row = f"| {impact} | {location} | {category} | {summary_text} |"
+    
+    # 詳細資訊：完整問題和建議
+    impact_icon = IMPACT_ICONS.get(impact, '🔵')
+    detail_section = f"""### {impact_icon} 問題 {idx} - {file_path} ({category}/{impact})
 **位置:** {line_range if line_range else '未指定'}
 
 **問題描述:**  
@@ -66,11 +140,13 @@ def format_review_output(all_issues: list, project_path: str, source_branch: str
 **調整:**  
 {suggestion}
 """
-        details_sections.append(detail_section)
-    
-    # 組合表格和折疊區域
-    table_text = "\n".join(table_rows)
-    details_text = "\n---\n\n".join(details_sections)
+    return table_row, detail_section
+
+
+def _render_note(header: str, table_rows: list, details_sections: list) -> str:
+    """組合表格和折疊區域"""
+    table_text = "\n".join([header, "", "| 影響 | 檔案 | 種類 | 摘要 |", "| --- | --- | --- | --- |"] + table_rows)
+    details_text = DETAILS_SEPARATOR.join(details_sections)
     
     return f"""{table_text}
 
@@ -14,37 +14,55 @@ from config import (
     POST_COMMENT,
     MAX_DIFF_CHARS,
     FILE_PATTERN,
+    DIFF_PAGE_SIZE,
+    MAX_NOTE_CHARS,
 )
 
+# 保留給評論標題、@mention 與隱藏標記的字元數
+NOTE_HEADER_RESERVE = 1000
+# 審查內容（不含標題等）的單則上限
+NOTE_BODY_LIMIT = MAX_NOTE_CHARS - NOTE_HEADER_RESERVE
 
-def _request_json(method: str, url: str, **kwargs):
-    """通用的 JSON API 請求函數"""
+
+def _request(method: str, url: str, **kwargs):
+    """通用的 API 請求函數，失敗時結束程式"""
     resp = requests.request(method, url, timeout=60, **kwargs)
     if resp.status_code >= 400:
         print(f"❌ 請求失敗 ({resp.status_code}): {url}\n{resp.text}")
         sys.exit(1)
-    return resp.json()
+    return resp
 
 
-def get_mr_diff():
-    """獲取 MR 的 diff 資訊"""
+def _request_json(method: str, url: str, **kwargs):
+    """通用的 JSON API 請求函數"""
+    return _request(method, url, **kwargs).json()
+
+
+def _project_url() -> str:
+    """回傳目前專案的 API URL"""
     encoded_project = quote(str(PROJECT_ID), safe="")
-    diff_url = f"{SERVER_URL}/api/v4/projects/{encoded_project}/merge_requests/{MR_IID}/changes"
-    print(f"正在獲取 MR diff: {diff_url}")
-    headers = {"PRIVATE-TOKEN": GITLAB_TOKEN}
-    data = _request_json("GET", diff_url, headers=headers)
+    return f"{SERVER_URL}/api/v4/projects/{encoded_project}"
+
+
+def _mr_url(mr_iid=None) -> str:
+    """回傳 MR 的 API URL（mr_iid 未指定時為 CI_MERGE_REQUEST_IID）"""
+    return f"{_project_url()}/merge_requests/{mr_iid or MR_IID}"
 
-    # 編譯 regex 模式
+
+def _compile_file_pattern():
+    """編譯 FILE_PATTERN regex"""
     try:
-        file_pattern = re.compile(FILE_PATTERN)
+        return re.compile(FILE_PATTERN)
     except re.error as e:
         print(f"❌ 無效的 FILE_PATTERN regex: {FILE_PATTERN}")
         print(f"   錯誤: {e}")
         sys.exit(1)
 
-    # 收集符合 regex 模式的檔案
+
+def _match_files(changes: list, file_pattern) -> list:
+    """收集符合 regex 模式的檔案"""
     matched_files = []
-    for change in data.get("changes", []):
+    for change in changes:
         file_path = change.get('new_path') or change.get('old_path')
         if not file_path:
             continue
@@ -61,7 +79,11 @@ def get_mr_diff():
             "file_path": file_path,
             "diff": diff_text
         })
+    return matched_files
+
 
+def _build_mr_data(data: dict, matched_files: list) -> dict:
+    """由 MR API 回應組出 mr_data"""
     author = data.get("author", {})
     return {
         "title": data.get("title", ""),
@@ -71,38 +93,195 @@ def get_mr_diff():
         "files": matched_files,
         "requester_username": author.get("username", ""),
         "requester_id": author.get("id"),
+        "head_sha": data.get("sha", ""),
     }
 
 
-def post_comment(review_text: str, requester_username: str = ""):
-    """將審查結果發佈為 MR 評論"""
+def get_mr_diff(mr_iid=None):
+    """獲取 MR 的 diff 資訊"""
+    diff_url = f"{_mr_url(mr_iid)}/changes"
+    print(f"正在獲取 MR diff: {diff_url}")
+    headers = {"PRIVATE-TOKEN": GITLAB_TOKEN}
+    data = _request_json("GET", diff_url, headers=headers)
+
+    file_pattern = _compile_file_pattern()
+    return _build_mr_data(data, _match_files(data.get("changes", []), file_pattern))
+
+
+def get_mr_info(mr_iid=None):
+    """獲取 MR metadata（不含 diff）"""
+    headers = {"PRIVATE-TOKEN": GITLAB_TOKEN}
+    data = _request_json("GET", _mr_url(mr_iid), headers=headers)
+    return _build_mr_data(data, [])
+
+
+def iter_mr_diff_pages(per_page: int = DIFF_PAGE_SIZE, spool=None, mr_iid=None):
+    """
+    逐頁獲取 MR diff（GitLab /diffs 分頁 API）
+    
+    Args:
+        per_page: 每頁檔案數
+        spool: DiffSpool；提供時 diff 寫入暫存檔，回傳的 file_info 只保留參照
+        mr_iid: MR IID，預設為 CI_MERGE_REQUEST_IID
+    
+    Yields:
+        list: 每一頁中符合 FILE_PATTERN 的檔案
+    """
+    diff_url = f"{_mr_url(mr_iid)}/diffs"
+    headers = {"PRIVATE-TOKEN": GITLAB_TOKEN}
+    file_pattern = _compile_file_pattern()
+    page = "1"
+    while page:
+        print(f"正在獲取 MR diff 第 {page} 頁: {diff_url}")
+        resp = _request("GET", diff_url, headers=headers, params={"page": page, "per_page": per_page})
+        matched_files = _match_files(resp.json(), file_pattern)
+        if spool is not None:
+            matched_files = [spool.add(f['file_path'], f['diff']) for f in matched_files]
+        yield matched_files
+        page = resp.headers.get("X-Next-Page", "")
+
+
+def get_mr_diff_spooled(spool, mr_iid=None):
+    """
+    低記憶體模式：分頁獲取 MR diff 並寫入 spool
+    
+    不使用一次回傳全部 diff 的 /changes API，記憶體用量只與單頁大小有關。
+    
+    Args:
+        spool: DiffSpool
+        mr_iid: MR IID，預設為 CI_MERGE_REQUEST_IID
+    
+    Returns:
+        dict: 與 get_mr_diff 相同格式的 mr_data，files 為 SpooledFileInfo
+    """
+    mr_data = get_mr_info(mr_iid)
+    for page in iter_mr_diff_pages(spool=spool, mr_iid=mr_iid):
+        mr_data['files'].extend(page)
+    return mr_data
+
+
+def get_mr_head_sha(mr_iid=None):
+    """
+    獲取 MR 目前的 head commit SHA
+    
+    供執行中重複檢查使用，請求失敗時不結束程式。
+    
+    Returns:
+        str | None: head SHA，請求失敗時回傳 None
+    """
+    headers = {"PRIVATE-TOKEN": GITLAB_TOKEN}
+    try:
+        resp = requests.get(_mr_url(mr_iid), headers=headers, timeout=30)
+    except requests.RequestException as e:
+        print(f"⚠️ 無法檢查 MR head SHA: {e}")
+        return None
+    if resp.status_code != 200:
+        print(f"⚠️ 無法檢查 MR head SHA ({resp.status_code})")
+        return None
+    return resp.json().get("sha")
+
+
+def list_open_mrs():
+    """
+    列出專案中所有開啟中的 MR（分頁 API，最久未更新的在前）
+    
+    Returns:
+        list: MR API 回應（含 iid、sha、title 等欄位）
+    """
+    list_url = f"{_project_url()}/merge_requests"
+    headers = {"PRIVATE-TOKEN": GITLAB_TOKEN}
+    params = {"state": "opened", "order_by": "updated_at", "sort": "asc", "per_page": 100}
+    mrs = []
+    page = "1"
+    while page:
+        resp = _request("GET", list_url, headers=headers, params=dict(params, page=page))
+        mrs.extend(resp.json())
+        page = resp.headers.get("X-Next-Page", "")
+    return mrs
+
+
+def review_marker(head_sha: str) -> str:
+    """回傳嵌入評論中、標記審查對象 SHA 的隱藏註解"""
+    return f"<!-- ai-code-review sha={head_sha} -->"
+
+
+def get_reviewed_shas(mr_iid=None):
+    """
+    從 MR 評論中找出已發佈過 AI 審查的 head SHA
+    
+    Args:
+        mr_iid: MR IID，預設為 CI_MERGE_REQUEST_IID
+    
+    Returns:
+        set: 已審查過的 SHA
+    """
+    notes_url = f"{_mr_url(mr_iid)}/notes"
+    headers = {"PRIVATE-TOKEN": GITLAB_TOKEN}
+    marker_pattern = re.compile(r"<!-- ai-code-review sha=([0-9a-f]+) -->")
+    shas = set()
+    page = "1"
+    while page:
+        resp = _request("GET", notes_url, headers=headers, params={"page": page, "per_page": 100})
+        for note in resp.json():
+            shas.update(marker_pattern.findall(note.get("body", "")))
+        page = resp.headers.get("X-Next-Page", "")
+    return shas
+
+
+def post_comment(review_text: str, requester_username: str = "", head_sha: str = "", mr_iid=None):
+    """將審查結果發佈為 MR 評論（head_sha 會以隱藏標記寫入，供後續執行判斷是否已審查）"""
+    post_review_notes([review_text], requester_username, head_sha, mr_iid)
+
+
+def post_review_notes(notes, requester_username: str = "", head_sha: str = "", mr_iid=None):
+    """
+    將審查結果依序發佈為一或多則 MR 評論
+    
+    notes 可為 generator（例如 formatter.iter_review_notes），只預先取出下一則以判斷是否為最後一則。
+    @mention 放在第一則；隱藏標記放在最後一則，全部發佈完成才視為已審查。
+    
+    Args:
+        notes: 每則評論的審查內容
+        requester_username: 要 @ 的使用者
+        head_sha: 此次審查的 commit SHA
+        mr_iid: MR IID，預設為 CI_MERGE_REQUEST_IID
+    """
     if not POST_COMMENT:
         print("⚠️ POST_COMMENT=false，僅在終端輸出結果。")
         return
 
-    encoded_project = quote(str(PROJECT_ID), safe="")
-    comment_url = f"{SERVER_URL}/api/v4/projects/{encoded_project}/merge_requests/{MR_IID}/notes"
+    comment_url = f"{_mr_url(mr_iid)}/notes"
     headers = {
         "PRIVATE-TOKEN": GITLAB_TOKEN,
         "Content-Type": "application/json",
     }
-    mention = f"@{requester_username} " if requester_username else ""
-    payload = {"body": f"## 🤖 AI Code Review\n\n{mention}{review_text}"}
-    resp = requests.post(comment_url, headers=headers, json=payload, timeout=60)
-    if resp.status_code in (200, 201):
-        print("✅ 已將審查結果留言至 MR。")
-    else:
-        print(f"⚠️ 無法送出 MR 評論 ({resp.status_code}): {resp.text}")
+    notes = iter(notes)
+    current = next(notes, None)
+    index = 1
+    while current is not None:
+        following = next(notes, None)
+        multiple = index > 1 or following is not None
+        title = f"## 🤖 AI Code Review（第 {index} 則）" if multiple else "## 🤖 AI Code Review"
+        mention = f"@{requester_username} " if requester_username and index == 1 else ""
+        marker = f"\n\n{review_marker(head_sha)}" if head_sha and following is None else ""
+        payload = {"body": f"{title}\n\n{mention}{current}{marker}"}
+        resp = requests.post(comment_url, headers=headers, json=payload, timeout=60)
+        if resp.status_code in (200, 201):
+            print(f"✅ 已將審查結果留言至 MR{f'（第 {index} 則）' if multiple else ''}。")
+        else:
+            print(f"⚠️ 無法送出 MR 評論 ({resp.status_code}): {resp.text}")
+            return
+        current = following
+        index += 1
 
 
-def reassign_to_requester(requester_id: int):
+def reassign_to_requester(requester_id: int, mr_iid=None):
     """將 MR assignee 改回 requester"""
     if not POST_COMMENT:
         print("⚠️ POST_COMMENT=false，跳過 assignee 更新。")
         return
 
-    encoded_project = quote(str(PROJECT_ID), safe="")
-    mr_url = f"{SERVER_URL}/api/v4/projects/{encoded_project}/merge_requests/{MR_IID}"
+    mr_url = _mr_url(mr_iid)
     headers = {
         "PRIVATE-TOKEN": GITLAB_TOKEN,
         "Content-Type": "application/json",
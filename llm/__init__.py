@@ -2,26 +2,33 @@
 
 import sys
 
+from config import AI_MAX_TOKENS, AI_TIMEOUT, LLM_CONCURRENCY
 from llm.base import LLMClient
-from llm.openai_client import OpenAIClient
+from llm.openai_client import OpenAIClient, OPENAI_BASE_URL
 from llm.claude_client import ClaudeClient
+from llm.metered import MeteredClient
+from llm.async_adapter import AsyncLLMClient
 
 
-def get_llm_client(model: str, api_key: str) -> LLMClient:
+def get_llm_client(model: str, api_key: str, base_url: str = "", api_mode: str = "") -> LLMClient:
     """
     根據模型名稱建立對應的 LLM 客戶端（工廠模式）
     
     Args:
         model: 模型名稱 (例如: gpt-4, claude-3-opus, gemini-pro)
         api_key: API 金鑰
+        base_url: OpenAI 相容服務的 API 根網址；設定後不論模型名稱皆使用 OpenAIClient
+        api_mode: "responses" 或 "chat"，留空則有 base_url 時用 chat，否則用 responses
     
     Returns:
         LLMClient: LLM 客戶端實例
     """
     model_lower = model.lower()
     
-    # 根據模型前綴判斷提供商
-    if model_lower.startswith("gpt-") or model_lower.startswith("o1-"):
+    # 根據模型前綴判斷提供商（自架服務的模型名稱不固定，一律走 OpenAI 相容 API）
+    if base_url:
+        provider = "openai"
+    elif model_lower.startswith("gpt-") or model_lower.startswith("o1-"):
         provider = "openai"
     elif model_lower.startswith("claude-"):
         provider = "claude"
@@ -31,16 +38,24 @@ def get_llm_client(model: str, api_key: str) -> LLMClient:
         provider = "openai"  # 預設
     
     if provider == "openai":
-        if not api_key:
+        if not api_key and not base_url:
             print("❌ 缺少 OpenAI API 金鑰")
             sys.exit(1)
-        return OpenAIClient(api_key=api_key, model=model)
+        return OpenAIClient(
+            api_key=api_key,
+            model=model,
+            base_url=base_url or OPENAI_BASE_URL,
+            api_mode=api_mode or ("chat" if base_url else "responses"),
+            max_tokens=AI_MAX_TOKENS,
+            timeout=AI_TIMEOUT,
+            pool_size=LLM_CONCURRENCY,
+        )
     
     elif provider == "claude":
         if not api_key:
             print("❌ 缺少 Claude API 金鑰")
             sys.exit(1)
-        return ClaudeClient(api_key=api_key, model=model)
+        return ClaudeClient(api_key=api_key, model=model, max_tokens=AI_MAX_TOKENS, timeout=AI_TIMEOUT)
     
     # 未來可以擴展其他 LLM 提供商
     # elif provider == "gemini":
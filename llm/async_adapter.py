@@ -0,0 +1,70 @@
+"""Asyncio adapter for synchronous LLM clients"""
+
+import asyncio
+import threading
+
+from llm.base import LLMClient
+
+
+class AsyncLLMClient:
+    """
+    將同步 LLMClient 包裝為 asyncio 介面
+
+    review_code 在背景 daemon thread 中執行，因此現有的 OpenAIClient、ClaudeClient
+    等同步實作不需修改即可在 pipeline 模式下並行呼叫。取消等待中的呼叫時，
+    該 thread 的結果會被丟棄，且不會阻擋程式結束。
+    """
+
+    def __init__(self, client: LLMClient, concurrency: int):
+        """
+        初始化 async 包裝器
+
+        Args:
+            client: 同步 LLM 客戶端
+            concurrency: 同時進行中的最大呼叫數
+        """
+        self.client = client
+        self.model = getattr(client, "model", "")
+        self.concurrency = concurrency
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def review_code(self, prompt: str) -> list:
+        """以非同步方式呼叫同步客戶端的 review_code"""
+        return await self.call(self.client.review_code, prompt)
+
+    async def call(self, func, *args):
+        """
+        在背景 thread 執行同步函式，與 review_code 共用並行上限
+
+        用於需要在同一個 thread 中讀取 last_usage / last_parsed 的呼叫（例如記錄批次歷史）。
+        """
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+
+            def run():
+                try:
+                    result = func(*args)
+                except BaseException as e:
+                    _resolve(loop, future, exception=e)
+                else:
+                    _resolve(loop, future, result=result)
+
+            threading.Thread(target=run, daemon=True).start()
+            return await future
+
+
+def _resolve(loop, future, result=None, exception=None):
+    """從背景 thread 回填 future；已取消或事件迴圈已關閉時直接丟棄"""
+    def set_outcome():
+        if future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    try:
+        loop.call_soon_threadsafe(set_outcome)
+    except RuntimeError:
+        pass
@@ -1,10 +1,39 @@
 """Base class for LLM clients"""
 
+import threading
 from abc import ABC, abstractmethod
 
 
 class LLMClient(ABC):
-    """LLM 客戶端抽象類別"""
+    """
+    LLM 客戶端抽象類別
+    
+    實作類別應在每次呼叫後更新 last_usage（input_tokens / output_tokens），
+    供成本統計使用，並以 last_parsed 標示回應是否成功解析（批次大小調校使用）。
+    兩者皆以執行緒區分，pipeline 模式下多個 worker 共用同一個客戶端也不會互相覆蓋。
+    """
+    
+    @property
+    def last_usage(self) -> dict:
+        """目前執行緒最近一次呼叫的 token 用量"""
+        return getattr(self._thread_state(), "usage", {})
+    
+    @last_usage.setter
+    def last_usage(self, usage: dict):
+        self._thread_state().usage = usage
+    
+    @property
+    def last_parsed(self) -> bool:
+        """目前執行緒最近一次呼叫的回應是否成功解析為問題列表"""
+        return getattr(self._thread_state(), "parsed", True)
+    
+    @last_parsed.setter
+    def last_parsed(self, parsed: bool):
+        self._thread_state().parsed = parsed
+    
+    def _thread_state(self):
+        """取得此客戶端的 thread-local 狀態"""
+        return self.__dict__.setdefault("_thread_local", threading.local())
     
     @abstractmethod
     def review_code(self, prompt: str) -> list:
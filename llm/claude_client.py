@@ -12,17 +12,21 @@ from llm.base import LLMClient
 class ClaudeClient(LLMClient):
     """Claude API 客戶端實作"""
     
-    def __init__(self, api_key: str, model: str):
+    def __init__(self, api_key: str, model: str, max_tokens: int = 0, timeout: int = 120):
         """
         初始化 Claude 客戶端
         
         Args:
             api_key: Anthropic API 金鑰
             model: 模型名稱 (例如: claude-3-5-sonnet-20241022)
+            max_tokens: 每次請求的最大輸出 tokens，0 表示依模型預設
+            timeout: 單次請求逾時秒數
         """
         self.api_key = api_key
         self.model = model
-        self.max_tokens = self._get_max_tokens(model)
+        self.max_tokens = max_tokens or self._get_max_tokens(model)
+        self.timeout = timeout
+        self.last_usage = {}
     
     def _get_max_tokens(self, model: str) -> int:
         """
@@ -83,7 +87,7 @@ class ClaudeClient(LLMClient):
             "https://api.anthropic.com/v1/messages",
             json=payload,
             headers=headers,
-            timeout=120,
+            timeout=self.timeout,
         )
         
         if resp.status_code != 200:
@@ -91,8 +95,11 @@ class ClaudeClient(LLMClient):
             sys.exit(1)
         
         data = resp.json()
+        self.last_usage = self._extract_usage(data)
         text = self._extract_text(data)
         if not text.strip():
+            # 空回應通常是輸出被截斷或過濾
+            self.last_parsed = False
             return []
         
         return self._parse_response(text)
@@ -106,13 +113,23 @@ class ClaudeClient(LLMClient):
                     return item.get("text", "")
         return ""
     
+    def _extract_usage(self, response: dict) -> dict:
+        """從 API 回應中提取 token 用量"""
+        usage = response.get("usage") or {}
+        return {
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+        }
+    
     def _parse_response(self, text: str) -> list:
         """解析 AI 回應的 JSON"""
         try:
             text = self.fix_invalid_json(text)
             issues = json.loads(text.strip())
+            self.last_parsed = True
             return issues
         except json.JSONDecodeError as e:
+            self.last_parsed = False
             print(f"⚠️ JSON 解析錯誤: {e}")
             print(f"⚠️ 錯誤位置: 第 {e.lineno} 行, 第 {e.colno} 列")
             
@@ -0,0 +1,48 @@
+"""LLM client wrapper that records call statistics"""
+
+import threading
+import time
+
+from llm.base import LLMClient
+from llm.pricing import estimate_cost
+
+
+class MeteredClient(LLMClient):
+    """包裝任一 LLMClient，累計呼叫次數、耗時與 token 用量"""
+
+    def __init__(self, client: LLMClient):
+        """
+        初始化統計包裝器
+
+        Args:
+            client: 實際呼叫 LLM 的客戶端
+        """
+        self.client = client
+        self.model = getattr(client, "model", "")
+        self.calls = 0
+        self.seconds = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.last_usage = {}
+        self._lock = threading.Lock()
+
+    def review_code(self, prompt: str) -> list:
+        """呼叫內部客戶端並累計統計"""
+        start = time.monotonic()
+        try:
+            return self.client.review_code(prompt)
+        finally:
+            elapsed = time.monotonic() - start
+            usage = getattr(self.client, "last_usage", {}) or {}
+            self.last_usage = usage
+            self.last_parsed = getattr(self.client, "last_parsed", True)
+            with self._lock:
+                self.calls += 1
+                self.seconds += elapsed
+                self.input_tokens += usage.get("input_tokens", 0)
+                self.output_tokens += usage.get("output_tokens", 0)
+
+    @property
+    def cost(self):
+        """累計成本（美元），未知模型回傳 None"""
+        return estimate_cost(self.model, self.input_tokens, self.output_tokens)
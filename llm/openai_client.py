@@ -5,23 +5,49 @@ import re
 import sys
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from llm.base import LLMClient
 
 
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+
 class OpenAIClient(LLMClient):
-    """OpenAI API 客戶端實作"""
+    """
+    OpenAI API 客戶端實作
+    
+    也可透過 base_url 指向 OpenAI 相容的自架服務（vLLM、llama.cpp server 等），
+    此時通常使用 Chat Completions API（api_mode="chat"）。
+    """
     
-    def __init__(self, api_key: str, model: str):
+    def __init__(self, api_key: str, model: str, base_url: str = OPENAI_BASE_URL,
+                 api_mode: str = "responses", max_tokens: int = 0, timeout: int = 120,
+                 pool_size: int = 4):
         """
         初始化 OpenAI 客戶端
         
         Args:
-            api_key: OpenAI API 金鑰
+            api_key: OpenAI API 金鑰（自架服務可為空）
             model: 模型名稱
+            base_url: API 根網址，例如 http://vllm.internal:8000/v1
+            api_mode: "responses"（/responses）或 "chat"（/chat/completions）
+            max_tokens: 每次請求的最大輸出 tokens，0 表示不限制
+            timeout: 單次請求逾時秒數
+            pool_size: 連線池大小，應不小於並行呼叫數，讓連線保持 keep-alive 重複使用
         """
         self.api_key = api_key
         self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.api_mode = api_mode
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.last_usage = {}
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
     
     def review_code(self, prompt: str) -> list:
         """
@@ -33,21 +59,39 @@ class OpenAIClient(LLMClient):
         Returns:
             list: 問題列表
         """
-        responses_payload = {
-            "model": self.model,
-            "input": prompt,
-        }
+        if self.api_mode == "chat":
+            url = f"{self.base_url}/chat/completions"
+            payload = {
+                "model": self.model,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+            }
+            if self.max_tokens:
+                payload["max_tokens"] = self.max_tokens
+        else:
+            url = f"{self.base_url}/responses"
+            payload = {
+                "model": self.model,
+                "input": prompt,
+            }
+            if self.max_tokens:
+                payload["max_output_tokens"] = self.max_tokens
         
         headers = {
-            "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
         
-        resp = requests.post(
-            "https://api.openai.com/v1/responses",
-            json=responses_payload,
+        resp = self.session.post(
+            url,
+            json=payload,
             headers=headers,
-            timeout=120,
+            timeout=self.timeout,
         )
         
         if resp.status_code != 200:
@@ -55,8 +99,14 @@ class OpenAIClient(LLMClient):
             sys.exit(1)
         
         data = resp.json()
-        text = self._extract_output_text(data)
+        self.last_usage = self._extract_usage(data)
+        if self.api_mode == "chat":
+            text = self._extract_chat_text(data)
+        else:
+            text = self._extract_output_text(data)
         if not text.strip():
+            # 空回應通常是輸出被截斷或過濾
+            self.last_parsed = False
             return []
         
         return self._parse_response(text)
@@ -70,14 +120,31 @@ class OpenAIClient(LLMClient):
                         return content.get("text", "")
         return ""
     
+    def _extract_chat_text(self, response: dict) -> str:
+        """從 Chat Completions 回應中提取文字內容"""
+        choices = response.get("choices") or []
+        if choices:
+            return (choices[0].get("message") or {}).get("content") or ""
+        return ""
+    
+    def _extract_usage(self, response: dict) -> dict:
+        """從 API 回應中提取 token 用量（Responses 與 Chat Completions 欄位名稱不同）"""
+        usage = response.get("usage") or {}
+        return {
+            "input_tokens": usage.get("input_tokens", usage.get("prompt_tokens", 0)),
+            "output_tokens": usage.get("output_tokens", usage.get("completion_tokens", 0)),
+        }
+    
     def _parse_response(self, text: str) -> list:
         """解析 AI 回應的 JSON"""
         try:
             text = self.fix_invalid_json(text)
             issues = json.loads(text.strip())
+            self.last_parsed = isinstance(issues, list)
             return issues if isinstance(issues, list) else []
         except json.JSONDecodeError:
             print(f"⚠️ 無法解析 JSON 回應: {text}")
+            self.last_parsed = False
             return []
         
     def fix_invalid_json(self, raw: str) -> dict | list:
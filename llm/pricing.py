@@ -0,0 +1,81 @@
+"""Token and cost estimation for LLM models"""
+
+# 每百萬 tokens 的美元價格 (input, output)
+# 以前綴比對，較長（較精確）的前綴優先
+MODEL_PRICING = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "o1-mini": (3.00, 12.00),
+    "o1-": (15.00, 60.00),
+    "claude-opus-4-6": (5.00, 25.00),
+    "claude-opus-4-5": (5.00, 25.00),
+    "claude-opus-4": (15.00, 75.00),
+    "claude-sonnet-4": (3.00, 15.00),
+    "claude-haiku-4": (1.00, 5.00),
+    "claude-3-5-sonnet": (3.00, 15.00),
+    "claude-3-5-haiku": (0.80, 4.00),
+    "claude-3-opus": (15.00, 75.00),
+    "claude-3-sonnet": (3.00, 15.00),
+    "claude-3-haiku": (0.25, 1.25),
+}
+
+# 粗估：程式碼約 4 字元/token，中文 prompt 約 1-2 字元/token，取折衷值
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(chars: int) -> int:
+    """
+    由字元數粗估 token 數
+
+    Args:
+        chars: 字元數
+
+    Returns:
+        int: 估計的 token 數
+    """
+    return max(1, chars // CHARS_PER_TOKEN) if chars > 0 else 0
+
+
+def get_model_pricing(model: str):
+    """
+    取得模型價格
+
+    Args:
+        model: 模型名稱
+
+    Returns:
+        tuple | None: (input, output) 每百萬 tokens 美元價格，未知模型回傳 None
+    """
+    model_lower = model.lower()
+    for prefix in sorted(MODEL_PRICING, key=len, reverse=True):
+        if model_lower.startswith(prefix):
+            return MODEL_PRICING[prefix]
+    return None
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int):
+    """
+    估算呼叫成本
+
+    Args:
+        model: 模型名稱
+        input_tokens: 輸入 token 數
+        output_tokens: 輸出 token 數
+
+    Returns:
+        float | None: 美元成本，未知模型回傳 None
+    """
+    pricing = get_model_pricing(model)
+    if pricing is None:
+        return None
+    input_price, output_price = pricing
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def format_cost(cost) -> str:
+    """將成本格式化為顯示字串"""
+    return f"${cost:.4f}" if cost is not None else "未知"
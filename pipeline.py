@@ -0,0 +1,215 @@
+"""Asyncio pipeline: stream diff pages into batches, LLM workers and results"""
+
+import asyncio
+import time
+
+from batching import Batcher
+from cascade import select_escalated
+from gitlab_client import iter_mr_diff_pages
+from llm import AsyncLLMClient
+from prompts import build_review_prompt, build_triage_prompt, build_batch_diff
+from supersede import RunSuperseded
+from tuning import review_with_history
+
+# 佇列結束標記
+_DONE = object()
+
+
+def run_pipeline(mr_data: dict, llm_client, concurrency: int, triage_client=None,
+                 node_index: int = 1, node_total: int = 1, spool=None, all_issues=None,
+                 guard=None, review_cache=None, batch_limits=None, history=None) -> dict:
+    """
+    以串流方式執行整個審查流程
+
+    diff 分頁 -> 分批器（批次一滿就送出）-> LLM workers -> 結果收集，
+    各階段以 asyncio.Queue 串接並同時進行，第一個 LLM 呼叫不必等整份 diff 下載完畢。
+
+    Args:
+        mr_data: MR metadata（需要 title、description）
+        llm_client: 深度審查用的同步 LLM 客戶端
+        concurrency: 同時進行的 LLM 呼叫數
+        triage_client: cascade 初篩用的同步 LLM 客戶端；None 則不初篩。
+                       pipeline 模式下以批次為單位初篩，升級的檔案直接以同一批送審
+        node_index: shard 序號（CI_NODE_INDEX）
+        node_total: shard 總數（CI_NODE_TOTAL）
+        spool: DiffSpool；提供時下載的 diff 寫入暫存檔（低記憶體模式）
+        all_issues: 問題累積器（list 或 IssueSpool），預設為新的 list
+        guard: SupersedeGuard；MR 有新 commit 時取消所有進行中的批次並拋出 RunSuperseded
+        review_cache: ReviewCache；提供時每個檔案先與上次審查對齊，只送未對齊的 hunk
+        batch_limits: (max_chars, max_files)；None 則使用 MAX_BATCH_CHARS / MAX_BATCH_FILES
+        history: BatchHistory；提供時記錄每個深度審查批次的大小、耗時與解析結果
+
+    Returns:
+        dict: issues（問題列表，含沿用的問題）、files（此次送審的檔案）、escalated（升級的檔案）、
+              batches（批次數）、matched（符合 FILE_PATTERN 的檔案數）、
+              unparsed（回應無法解析的批次中的檔案路徑）
+    """
+    if all_issues is None:
+        all_issues = []
+    return asyncio.run(_run(mr_data, llm_client, concurrency, triage_client, node_index, node_total,
+                            spool, all_issues, guard, review_cache, batch_limits, history))
+
+
+async def _run(mr_data, llm_client, concurrency, triage_client, node_index, node_total,
+               spool, all_issues, guard, review_cache, batch_limits, history) -> dict:
+    started = time.monotonic()
+    result = {"issues": all_issues, "files": [], "escalated": [], "batches": 0, "matched": 0, "unparsed": set()}
+    state = {"started": started, "first_call": None, "emitted": [], "reused": []}
+
+    review_client = AsyncLLMClient(llm_client, concurrency)
+    triage_async = AsyncLLMClient(triage_client, concurrency) if triage_client else None
+
+    # batch_queue 設上限，避免下載速度遠快於審查時在記憶體中堆積批次
+    batch_queue = asyncio.Queue(maxsize=concurrency * 2)
+    result_queue = asyncio.Queue()
+
+    producer = asyncio.create_task(
+        _produce_batches(batch_queue, result, state, concurrency, node_index, node_total, spool, review_cache,
+                         batch_limits)
+    )
+    workers = [
+        asyncio.create_task(_review_worker(batch_queue, result_queue, mr_data, review_client, triage_async,
+                                           state, guard, history, result["unparsed"]))
+        for _ in range(concurrency)
+    ]
+    collector = asyncio.create_task(_collect_results(result_queue, result, state))
+    watcher = asyncio.create_task(_watch_superseded(guard)) if guard else None
+
+    tasks = [producer, *workers]
+    pending = set(tasks) | ({watcher} if watcher else set())
+    try:
+        # 任一 task 失敗（含 watcher 偵測到 MR 被更新）即取消其餘 task
+        while any(not task.done() for task in tasks):
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+    except BaseException:
+        for task in tasks + [collector]:
+            task.cancel()
+        raise
+    finally:
+        if watcher:
+            watcher.cancel()
+
+    await result_queue.put(_DONE)
+    await collector
+    # 沿用的問題排在此次審查結果之後，與循序模式一致
+    result["issues"].extend(state["reused"])
+
+    elapsed = time.monotonic() - started
+    if state["first_call"] is not None:
+        print(f"\n⏱️ 第一個 LLM 呼叫於 {state['first_call']:.1f}s 發出，總耗時 {elapsed:.1f}s")
+    return result
+
+
+async def _produce_batches(batch_queue, result, state, concurrency, node_index, node_total, spool,
+                           review_cache, batch_limits):
+    """逐頁下載 diff 並增量分批，批次一滿就送入佇列"""
+    batcher = Batcher(*batch_limits) if batch_limits else Batcher()
+    pages = iter_mr_diff_pages(spool=spool)
+    batch_idx = 0
+
+    async def emit(batches):
+        nonlocal batch_idx
+        for batch in batches:
+            batch_idx += 1
+            # 與 select_shard 相同的輪流分配規則
+            if (batch_idx - 1) % node_total != node_index - 1:
+                continue
+            result["batches"] += 1
+            result["files"].extend(batch)
+            state["emitted"].append(batch_idx)
+            await batch_queue.put((batch_idx, batch))
+
+    while True:
+        page = await asyncio.to_thread(next, pages, None)
+        if page is None:
+            break
+        for file_info in page:
+            result["matched"] += 1
+            if review_cache:
+                file_info, reused_issues = review_cache.plan_file(file_info, spool)
+                state["reused"].extend(reused_issues)
+                if file_info is None:
+                    continue
+            await emit(batcher.add(file_info))
+    await emit(batcher.flush())
+    if review_cache:
+        review_cache.print_summary()
+
+    for _ in range(concurrency):
+        await batch_queue.put(_DONE)
+
+
+async def _review_worker(batch_queue, result_queue, mr_data, review_client, triage_client, state, guard,
+                         history, unparsed):
+    """從佇列取出批次並呼叫 LLM 審查"""
+    while True:
+        item = await batch_queue.get()
+        if item is _DONE:
+            return
+        batch_idx, batch = item
+
+        if guard:
+            await asyncio.to_thread(guard.check)
+
+        if state["first_call"] is None:
+            state["first_call"] = time.monotonic() - state["started"]
+
+        escalated = batch
+        if triage_client:
+            print(f"\n[初篩 {batch_idx}] 正在評分 {len(batch)} 個檔案")
+            file_info, diff_content = build_batch_diff(batch)
+            prompt = build_triage_prompt(mr_data['title'], file_info, diff_content)
+            escalated = select_escalated(batch, await triage_client.review_code(prompt))
+
+        issues = []
+        if escalated:
+            print(f"\n[批次 {batch_idx}] 正在審查: {', '.join(fd['file_path'] for fd in escalated)}")
+            file_info, diff_content = build_batch_diff(escalated)
+            prompt = build_review_prompt(
+                mr_data['title'],
+                mr_data['description'],
+                file_info,
+                diff_content
+            )
+            issues = await review_client.call(review_with_history, review_client.client, prompt, escalated,
+                                              history, unparsed) or []
+
+        await result_queue.put((batch_idx, escalated, issues))
+
+
+async def _watch_superseded(guard):
+    """定期檢查 MR head SHA，被取代時拋出 RunSuperseded"""
+    while True:
+        await asyncio.sleep(guard.interval)
+        if await asyncio.to_thread(guard.is_superseded):
+            raise RunSuperseded(guard.run_sha, guard.head_sha)
+
+
+async def _collect_results(result_queue, result, state):
+    """
+    收集各批次的審查結果
+
+    結果依批次順序寫入累積器（不受 LLM 回應先後影響），
+    只暫存尚未輪到的少數批次結果。
+    """
+    pending = {}
+    next_pos = 0
+    while True:
+        item = await result_queue.get()
+        if item is _DONE:
+            return
+        batch_idx, escalated, issues = item
+        if issues:
+            print(f"✅ [批次 {batch_idx}] 完成審查: 發現 {len(issues)} 個問題")
+        else:
+            print(f"✅ [批次 {batch_idx}] 完成審查: 無問題")
+
+        pending[batch_idx] = (escalated, issues)
+        emitted = state["emitted"]
+        while next_pos < len(emitted) and emitted[next_pos] in pending:
+            escalated, issues = pending.pop(emitted[next_pos])
+            result["escalated"].extend(escalated)
+            result["issues"].extend(issues)
+            next_pos += 1
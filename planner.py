@@ -0,0 +1,153 @@
+"""Dry-run planning: estimate LLM calls, tokens, cost and wall time"""
+
+import heapq
+import json
+
+from batching import diff_size_of
+from llm.pricing import estimate_tokens, estimate_cost, format_cost
+from prompts import build_review_prompt, build_triage_prompt, build_batch_diff
+
+# 每個檔案預估的輸出 tokens（約 1-2 個問題，含建議程式碼）
+OUTPUT_TOKENS_PER_FILE = 400
+# 初篩每個檔案只輸出 {file_path, score}
+TRIAGE_OUTPUT_TOKENS_PER_FILE = 20
+
+# 延遲模型：固定開銷 + 讀取 prompt + 逐 token 生成
+CALL_OVERHEAD_SECONDS = 2.0
+INPUT_TOKENS_PER_SECOND = 5000
+OUTPUT_TOKENS_PER_SECOND = 60
+
+
+def estimate_call_seconds(input_tokens: int, output_tokens: int) -> float:
+    """估算單次 LLM 呼叫耗時（秒）"""
+    return (CALL_OVERHEAD_SECONDS
+            + input_tokens / INPUT_TOKENS_PER_SECOND
+            + output_tokens / OUTPUT_TOKENS_PER_SECOND)
+
+
+def estimate_wall_seconds(call_seconds: list, concurrency: int) -> float:
+    """
+    估算在指定並行數下完成所有呼叫的總時間
+
+    依序將呼叫指派給最早空出的 worker（與 pipeline 的 worker 取用順序相同）。
+
+    Args:
+        call_seconds: 每次呼叫的耗時
+        concurrency: 並行數
+
+    Returns:
+        float: 總耗時（秒）
+    """
+    if not call_seconds:
+        return 0.0
+    workers = [0.0] * max(1, concurrency)
+    for seconds in call_seconds:
+        heapq.heapreplace(workers, workers[0] + seconds)
+    return max(workers)
+
+
+def build_plan(batches: list, mr_data: dict, model: str, concurrency: int, triage_model: str = "") -> dict:
+    """
+    建立審查計畫（不呼叫任何 LLM）
+
+    Args:
+        batches: create_batches 產生的批次
+        mr_data: MR 資訊
+        model: 深度審查模型（AI_MODEL）
+        concurrency: 並行數
+        triage_model: cascade 初篩模型，空字串表示未啟用
+
+    Returns:
+        dict: 可直接輸出為 JSON 的計畫
+    """
+    batch_plans = []
+    for batch_idx, batch in enumerate(batches, 1):
+        file_info, diff_content = build_batch_diff(batch)
+        prompt = build_review_prompt(mr_data['title'], mr_data['description'], file_info, diff_content)
+        input_tokens = estimate_tokens(len(prompt))
+        output_tokens = OUTPUT_TOKENS_PER_FILE * len(batch)
+        batch_plan = {
+            "index": batch_idx,
+            "files": [fd['file_path'] for fd in batch],
+            "diff_chars": sum(diff_size_of(fd) for fd in batch),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost_usd": _round_cost(estimate_cost(model, input_tokens, output_tokens)),
+            "seconds": round(estimate_call_seconds(input_tokens, output_tokens), 1),
+        }
+
+        if triage_model:
+            triage_prompt = build_triage_prompt(mr_data['title'], file_info, diff_content)
+            triage_input = estimate_tokens(len(triage_prompt))
+            triage_output = TRIAGE_OUTPUT_TOKENS_PER_FILE * len(batch)
+            batch_plan["triage"] = {
+                "input_tokens": triage_input,
+                "output_tokens": triage_output,
+                "cost_usd": _round_cost(estimate_cost(triage_model, triage_input, triage_output)),
+                "seconds": round(estimate_call_seconds(triage_input, triage_output), 1),
+            }
+        batch_plans.append(batch_plan)
+
+    # cascade 模式先完成初篩再深度審查；深度審查以全部檔案升級估算（上限）
+    triage_calls = [bp["triage"] for bp in batch_plans if "triage" in bp]
+    calls = batch_plans + triage_calls
+    wall_seconds = (estimate_wall_seconds([tc["seconds"] for tc in triage_calls], concurrency)
+                    + estimate_wall_seconds([bp["seconds"] for bp in batch_plans], concurrency))
+
+    return {
+        "model": model,
+        "triage_model": triage_model or None,
+        "concurrency": concurrency,
+        "file_count": sum(len(batch) for batch in batches),
+        "batch_count": len(batches),
+        "batches": batch_plans,
+        "totals": {
+            "llm_calls": len(calls),
+            "input_tokens": sum(call["input_tokens"] for call in calls),
+            "output_tokens": sum(call["output_tokens"] for call in calls),
+            "cost_usd": _sum_costs([call["cost_usd"] for call in calls]),
+            "wall_seconds": round(wall_seconds, 1),
+        },
+    }
+
+
+def print_plan(plan: dict):
+    """輸出逐批次表格與 JSON 計畫"""
+    print("\n" + "=" * 80)
+    print("審查計畫（dry run，未呼叫 LLM）")
+    print("=" * 80)
+    print(f"{'批次':>4}  {'檔案':>4}  {'diff 字元':>10}  {'輸入 tokens':>11}  {'輸出 tokens':>11}  {'成本':>9}  {'耗時':>7}")
+    for bp in plan["batches"]:
+        print(f"{bp['index']:>4}  {len(bp['files']):>4}  {bp['diff_chars']:>10}  {bp['input_tokens']:>11}  "
+              f"{bp['output_tokens']:>11}  {format_cost(bp['cost_usd']):>9}  {bp['seconds']:>6.1f}s")
+
+    totals = plan["totals"]
+    print("-" * 80)
+    print(f"模型: {plan['model']}" + (f"（初篩: {plan['triage_model']}）" if plan['triage_model'] else ""))
+    print(f"檔案: {plan['file_count']}，批次: {plan['batch_count']}，LLM 呼叫: {totals['llm_calls']}")
+    print(f"Tokens: 輸入 {totals['input_tokens']}，輸出 {totals['output_tokens']}")
+    print(f"預估成本: {format_cost(totals['cost_usd'])}")
+    print(f"預估耗時: {totals['wall_seconds']:.1f}s（並行數 {plan['concurrency']}）")
+    if plan['triage_model']:
+        print("⚠️ Cascade 模式下深度審查以全部檔案升級估算，實際成本與耗時通常更低")
+    print("=" * 80)
+    print(json.dumps(plan, ensure_ascii=False, indent=2))
+
+
+def write_plan(path: str, plan: dict):
+    """將計畫寫入 JSON 檔案"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(plan, f, ensure_ascii=False, indent=2)
+    print(f"✅ 已寫入審查計畫: {path}")
+
+
+def _sum_costs(costs: list):
+    """加總成本，任一項未知則回傳 None"""
+    if any(cost is None for cost in costs):
+        return None
+    return _round_cost(sum(costs))
+
+
+def _round_cost(cost):
+    """成本取到小數第 6 位"""
+    return round(cost, 6) if cost is not None else None
@@ -71,3 +71,64 @@ def build_review_prompt(mr_title: str, mr_description: str, file_info: str, diff
         file_info=file_info,
         diff_content=diff_content
     ).strip()
+
+
+TRIAGE_PROMPT_TEMPLATE = """
+你負責初步篩選 Git diff，判斷每個檔案是否值得深度程式碼審查。
+
+評分規則（0-10）：
+- 0-2：僅格式、註解、命名、import 排序、自動產生的程式碼等瑣碎變更
+- 3-5：小幅邏輯調整，風險低
+- 6-10：新增或修改邏輯、資料處理、並行、安全性、錯誤處理、公開介面等需要仔細審查的變更
+
+輸出格式：
+- 只輸出可被 Python json.loads 解析的 JSON 陣列，不要輸出其他文字或 markdown
+- 每個檔案一個物件：{{"file_path": "完整檔案路徑", "score": 0-10 的整數}}
+- 每個提供的檔案都必須出現一次，file_path 與提供的路徑一致
+
+MR 標題: {mr_title}
+{file_info}
+
+Git diff:
+```diff
+{diff_content}
+```
+"""
+
+
+def build_triage_prompt(mr_title: str, file_info: str, diff_content: str) -> str:
+    """
+    建立初篩 prompt（cascade 模式）
+    
+    Args:
+        mr_title: MR 標題
+        file_info: 檔案資訊（單一檔案或批次檔案數量）
+        diff_content: Git diff 內容
+    
+    Returns:
+        str: 格式化的 prompt
+    """
+    return TRIAGE_PROMPT_TEMPLATE.format(
+        mr_title=mr_title,
+        file_info=file_info,
+        diff_content=diff_content
+    ).strip()
+
+
+def build_batch_diff(batch: list) -> tuple:
+    """
+    將一個批次的檔案組成 prompt 所需的檔案資訊與 diff 內容
+    
+    Args:
+        batch: 檔案列表，每個元素包含 file_path 與 diff
+    
+    Returns:
+        tuple: (file_info, diff_content)
+    """
+    if len(batch) == 1:
+        return f"檔案: {batch[0]['file_path']}", batch[0]['diff']
+    
+    diff_parts = []
+    for fd in batch:
+        diff_parts.append(f"\n{'='*80}\n檔案: {fd['file_path']}\n{'='*80}\n{fd['diff']}")
+    return f"檔案數量: {len(batch)}", "\n".join(diff_parts)
@@ -0,0 +1,256 @@
+"""Rebase-tolerant reuse of prior review findings via hunk alignment"""
+
+import difflib
+import hashlib
+import json
+import os
+import re
+
+HUNK_HEADER_PATTERN = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+LINE_RANGE_PATTERN = re.compile(r"L?(\d+)(?:\s*-\s*L?(\d+))?")
+
+
+def parse_hunks(diff_text: str) -> tuple:
+    """
+    將 unified diff 拆成 hunk
+
+    Args:
+        diff_text: 單一檔案的 diff
+
+    Returns:
+        tuple: (header_lines, hunks)。每個 hunk 包含 new_start、new_end（新檔行號範圍）、
+               lines（原始行，含 @@ 標頭）與 signature（新增與刪除行內容的雜湊；
+               沒有任何變更行時為空字串）
+    """
+    header_lines = []
+    hunks = []
+    current = None
+
+    for line in diff_text.split("\n"):
+        match = HUNK_HEADER_PATTERN.match(line)
+        if match:
+            new_start = int(match.group(1))
+            new_len = int(match.group(2)) if match.group(2) is not None else 1
+            current = {
+                "new_start": new_start,
+                "new_end": new_start + max(new_len, 1) - 1,
+                "lines": [line],
+                "changed": [],
+            }
+            hunks.append(current)
+        elif current is None:
+            header_lines.append(line)
+        else:
+            current["lines"].append(line)
+            if line.startswith(("+", "-")):
+                current["changed"].append(line)
+
+    for hunk in hunks:
+        # 以變更行內容（保留 +/- 前綴）判斷 hunk 是否相同，與行號位移無關
+        changed = hunk.pop("changed")
+        hunk["signature"] = hashlib.sha1("\n".join(changed).encode("utf-8")).hexdigest() if changed else ""
+    return header_lines, hunks
+
+
+def parse_line_range(line_range: str):
+    """
+    解析 L13-L24 / L42 格式的行數範圍
+
+    Returns:
+        tuple | None: (start, end)，無法解析時回傳 None
+    """
+    match = LINE_RANGE_PATTERN.search(line_range or "")
+    if not match:
+        return None
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else start
+    return start, end
+
+
+def _alignment_keys(hunks: list, side: str) -> list:
+    """回傳對齊用的 key；沒有簽章的 hunk 給予唯一 key，永遠不會被視為相同"""
+    return [h["signature"] or (side, idx) for idx, h in enumerate(hunks)]
+
+
+def format_line_range(start: int, end: int) -> str:
+    """將行數範圍格式化為 L13-L24 / L42"""
+    return f"L{start}" if start == end else f"L{start}-L{end}"
+
+
+class ReviewCache:
+    """
+    保存上次審查的 hunk 簽章與問題，rebase 後只重新審查新增或修改的 hunk
+
+    對每個檔案，以變更行內容的雜湊將新舊 hunk 對齊（difflib.SequenceMatcher）：
+    對齊成功的 hunk 沿用上次的問題並把 line_range 位移到新行號，其餘 hunk 才送 LLM。
+    """
+
+    def __init__(self, path: str, previous: dict):
+        """
+        初始化快取
+
+        Args:
+            path: 快取檔案路徑
+            previous: 上次儲存的內容（{"sha", "files": {path: {"hunks", "issues"}}}）
+        """
+        self.path = path
+        self.previous_files = previous.get("files", {})
+        self.current_hunks = {}
+        self.reused_files = 0
+        self.reused_issues = 0
+        self.reused_hunks = 0
+        self.pending_hunks = 0
+
+    @classmethod
+    def load(cls, cache_dir: str, project_id: str, mr_iid: str) -> "ReviewCache":
+        """
+        從快取目錄載入指定 MR 的上次審查結果
+
+        Args:
+            cache_dir: 快取目錄
+            project_id: 專案 ID 或路徑
+            mr_iid: MR IID
+
+        Returns:
+            ReviewCache: 快取（檔案不存在或損毀時為空）
+        """
+        safe_project = re.sub(r"[^A-Za-z0-9_.-]", "_", str(project_id))
+        path = os.path.join(cache_dir, f"mr-{safe_project}-{mr_iid}.json")
+        previous = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    previous = json.load(f)
+                print(f"♻️ 載入上次審查結果: {path} (sha: {previous.get('sha', '')[:8]})")
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"⚠️ 無法讀取審查快取 {path}: {e}")
+        return cls(path, previous)
+
+    def apply(self, files: list, all_issues, spool=None) -> list:
+        """
+        對所有檔案套用 plan_file
+
+        Args:
+            files: 檔案列表
+            all_issues: 問題累積器，沿用的問題會加入其中
+            spool: DiffSpool；提供時縮減後的 diff 也寫入暫存檔
+
+        Returns:
+            list: 需要送 LLM 審查的檔案
+        """
+        to_review = []
+        for file_info in files:
+            reduced, reused_issues = self.plan_file(file_info, spool)
+            all_issues.extend(reused_issues)
+            if reduced is not None:
+                to_review.append(reduced)
+        self.print_summary()
+        return to_review
+
+    def plan_file(self, file_info: dict, spool=None) -> tuple:
+        """
+        比對單一檔案與上次審查的 diff
+
+        Args:
+            file_info: 檔案資訊（file_path, diff）
+            spool: DiffSpool；提供時縮減後的 diff 也寫入暫存檔
+
+        Returns:
+            tuple: (to_review, reused_issues)。to_review 為需送 LLM 的 file_info
+                   （只含未對齊的 hunk），全部對齊時為 None
+        """
+        file_path = file_info['file_path']
+        diff_text = file_info['diff']
+        header_lines, hunks = parse_hunks(diff_text)
+        self.current_hunks[file_path] = [
+            {"new_start": h["new_start"], "new_end": h["new_end"], "signature": h["signature"]}
+            for h in hunks
+        ]
+
+        previous = self.previous_files.get(file_path)
+        if not previous or not hunks:
+            self.pending_hunks += len(hunks)
+            return file_info, []
+
+        old_hunks = previous.get("hunks", [])
+        matcher = difflib.SequenceMatcher(
+            None,
+            _alignment_keys(old_hunks, "old"),
+            _alignment_keys(hunks, "new"),
+            autojunk=False,
+        )
+        # 舊 hunk 索引 -> 新 hunk 索引
+        aligned = {}
+        for block in matcher.get_matching_blocks():
+            for offset in range(block.size):
+                aligned[block.a + offset] = block.b + offset
+
+        reused_issues = self._remap_issues(previous.get("issues", []), old_hunks, hunks, aligned)
+        aligned_new = set(aligned.values())
+        pending = [hunk for idx, hunk in enumerate(hunks) if idx not in aligned_new]
+        self.reused_hunks += len(hunks) - len(pending)
+        self.pending_hunks += len(pending)
+        self.reused_issues += len(reused_issues)
+
+        if not pending:
+            self.reused_files += 1
+            return None, reused_issues
+
+        reduced_lines = list(header_lines)
+        for hunk in pending:
+            reduced_lines.extend(hunk["lines"])
+        reduced_diff = "\n".join(reduced_lines)
+        if spool is not None:
+            return spool.add(file_path, reduced_diff), reused_issues
+        return {"file_path": file_path, "diff": reduced_diff}, reused_issues
+
+    def _remap_issues(self, issues: list, old_hunks: list, new_hunks: list, aligned: dict) -> list:
+        """沿用落在已對齊 hunk 內的問題，並將 line_range 位移到新行號"""
+        all_aligned = len(aligned) == len(old_hunks) == len(new_hunks)
+        remapped = []
+        for issue in issues:
+            line_range = parse_line_range(issue.get('line_range', ''))
+            if line_range is None:
+                # 無法定位的問題只在整個檔案都沒變時沿用
+                if all_aligned:
+                    remapped.append(issue)
+                continue
+
+            start, end = line_range
+            for old_idx, new_idx in aligned.items():
+                old_hunk = old_hunks[old_idx]
+                if old_hunk["new_start"] <= start and end <= old_hunk["new_end"]:
+                    delta = new_hunks[new_idx]["new_start"] - old_hunk["new_start"]
+                    remapped.append(dict(issue, line_range=format_line_range(start + delta, end + delta)))
+                    break
+        return remapped
+
+    def print_summary(self):
+        """輸出重用統計"""
+        print(f"♻️ 重用上次審查: {self.reused_files} 個檔案完全沿用，"
+              f"{self.reused_hunks} 個 hunk 對齊、{self.reused_issues} 個問題沿用，"
+              f"{self.pending_hunks} 個 hunk 需重新審查")
+
+    def save(self, all_issues, head_sha: str, exclude=()):
+        """
+        儲存此次審查的 hunk 簽章與問題，供下次執行比對
+
+        Args:
+            all_issues: 此次的全部問題（含沿用的問題）
+            head_sha: 此次審查的 commit SHA
+            exclude: 不寫入快取的檔案路徑（LLM 回應無法解析的批次），下次執行整個檔案重新審查
+        """
+        files = {
+            path: {"hunks": hunks, "issues": []}
+            for path, hunks in self.current_hunks.items()
+            if path not in exclude
+        }
+        for issue in all_issues:
+            entry = files.get(issue.get('file_path'))
+            if entry is not None:
+                entry["issues"].append(issue)
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"sha": head_sha, "files": files}, f, ensure_ascii=False)
+        print(f"♻️ 已更新審查快取: {self.path}")
@@ -1,13 +1,17 @@
 #!/usr/bin/env python3
 """GitLab MR reviewer powered by LLM
 
-兩種執行模式：
+執行模式：
   全流程模式（CI/CD）：python review_mr.py
   Skill 模式（Claude Code 已分析）：python review_mr.py --issues-file /tmp/issues.json
+  Dry run（估算成本與耗時）：python review_mr.py --plan --plan-output plan.json
+  Sweep（審查專案中所有開啟中的 MR）：python review_mr.py --sweep
+
+Shard 模式（GitLab parallel:）：CI_NODE_TOTAL > 1 時每個 job 只審查部分批次並寫入
+SHARD_DIR，最後由合併 job 執行 python review_mr.py --issues-file review-shards/*.json
 """
 
 import argparse
-import json
 import sys
 
 # Windows 終端機預設 cp950，強制 stdout 使用 UTF-8 避免 emoji 報錯
@@ -22,65 +26,101 @@ from config import (
     MR_IID,
     AI_ACCESS_KEY,
     AI_MODEL,
+    AI_BASE_URL,
+    AI_API_MODE,
     POST_COMMENT,
-    MAX_BATCH_CHARS,
-    MAX_BATCH_FILES,
     FILE_PATTERN,
+    CASCADE_MODEL,
+    CASCADE_ACCESS_KEY,
+    CASCADE_BASE_URL,
+    NODE_INDEX,
+    NODE_TOTAL,
+    SHARD_DIR,
+    LOW_MEMORY,
+    PIPELINE_MODE,
+    LLM_CONCURRENCY,
+    RUN_SHA,
+    SUPERSEDE_CHECK,
+    SUPERSEDE_CHECK_INTERVAL,
+    REVIEW_CACHE_DIR,
+    SWEEP_TOKEN_BUDGET,
+    BATCH_HISTORY_FILE,
+    AUTO_BATCH_SIZE,
+)
+from gitlab_client import (
+    get_mr_diff,
+    get_mr_diff_spooled,
+    get_mr_info,
+    get_reviewed_shas,
+    post_review_notes,
+    reassign_to_requester,
+    NOTE_BODY_LIMIT,
 )
-from gitlab_client import get_mr_diff, post_comment, reassign_to_requester
-from llm import get_llm_client
-from prompts import build_review_prompt
-from formatter import format_review_output
+from llm import get_llm_client, MeteredClient
+from prompts import build_review_prompt, build_batch_diff
+from formatter import iter_review_notes
+from batching import create_batches
+from cascade import triage_batches, print_cascade_report
+from sharding import select_shard, shard_file_path, write_shard_file, load_issues_files
+from pipeline import run_pipeline
+from spool import DiffSpool, IssueSpool, peak_rss_mb
+from planner import build_plan, print_plan, write_plan
+from supersede import SupersedeGuard, RunSuperseded
+from reuse import ReviewCache
+from sweep import run_sweep
+from tuning import BatchHistory, review_with_history, resolve_batch_limits
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description="GitLab MR Code Reviewer")
     parser.add_argument(
         "--issues-file",
-        help="跳過 LLM 分析，直接讀入 Claude Code 預分析的 JSON 檔案（skill 模式）",
+        nargs="+",
+        help="跳過 LLM 分析，直接讀入 Claude Code 預分析的 JSON 檔案（skill 模式）；"
+             "可傳入多個 shard 結果檔合併後發佈",
+    )
+    parser.add_argument(
+        "--issues-output",
+        help="將問題一產生就以 JSONL 串流寫入此檔案（可再以 --issues-file 讀回）",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="只估算 LLM 呼叫數、tokens、成本與耗時，不呼叫 LLM 也不發佈評論（dry run）",
+    )
+    parser.add_argument(
+        "--plan-output",
+        help="將審查計畫另存為 JSON 檔案",
+    )
+    parser.add_argument(
+        "--plan-concurrency",
+        type=int,
+        help="估算耗時使用的並行數（預設 pipeline 模式為 LLM_CONCURRENCY，否則為 1）",
+    )
+    parser.add_argument(
+        "--sweep",
+        action="store_true",
+        help="審查專案中所有開啟中、且目前 commit 尚未審查過的 MR（共用 LLM_CONCURRENCY 與 SWEEP_TOKEN_BUDGET）",
     )
     return parser.parse_args()
 
 
-def create_batches(files):
-    """將檔案分組為批次"""
-    batches = []
-    current_batch = []
-    current_batch_size = 0
+def process_batches(batches, mr_data, llm_client, all_issues=None, guard=None, history=None, unparsed=None):
+    """
+    處理所有批次並收集問題
     
-    for file_info in files:
-        diff_size = len(file_info['diff'])
-        
-        # 如果單個檔案超過批次限制，單獨處理
-        if diff_size > MAX_BATCH_CHARS:
-            if current_batch:
-                batches.append(current_batch)
-                current_batch = []
-                current_batch_size = 0
-            batches.append([file_info])
-        # 如果加入當前批次會超過限制，開始新批次
-        elif (current_batch_size + diff_size > MAX_BATCH_CHARS or 
-              len(current_batch) >= MAX_BATCH_FILES):
-            batches.append(current_batch)
-            current_batch = [file_info]
-            current_batch_size = diff_size
-        # 加入當前批次
-        else:
-            current_batch.append(file_info)
-            current_batch_size += diff_size
-    
-    # 加入最後一個批次
-    if current_batch:
-        batches.append(current_batch)
-    
-    return batches
-
-
-def process_batches(batches, mr_data, llm_client):
-    """處理所有批次並收集問題"""
-    all_issues = []
+    all_issues 可傳入 IssueSpool，讓問題逐批寫入暫存檔而非累積在記憶體中；
+    提供 guard 時每個批次前檢查 MR 是否已有新 commit，被取代則拋出 RunSuperseded；
+    提供 history（BatchHistory）時記錄每個批次的大小、耗時與解析結果；
+    提供 unparsed（set）時加入回應無法解析的批次的檔案路徑
+    """
+    if all_issues is None:
+        all_issues = []
     
     for batch_idx, batch in enumerate(batches, 1):
+        if guard:
+            guard.check()
+        
         file_paths = [f['file_path'] for f in batch]
         if len(batch) == 1:
             print(f"\n[批次 {batch_idx}/{len(batches)}] 正在審查: {file_paths[0]}")
@@ -90,15 +130,7 @@ def process_batches(batches, mr_data, llm_client):
                 print(f"  - {fp}")
         
         # 構建 prompt（與 LLM 無關）
-        if len(batch) == 1:
-            file_info = f"檔案: {batch[0]['file_path']}"
-            diff_content = batch[0]['diff']
-        else:
-            file_info = f"檔案數量: {len(batch)}"
-            diff_parts = []
-            for fd in batch:
-                diff_parts.append(f"\n{'='*80}\n檔案: {fd['file_path']}\n{'='*80}\n{fd['diff']}")
-            diff_content = "\n".join(diff_parts)
+        file_info, diff_content = build_batch_diff(batch)
         
         prompt = build_review_prompt(
             mr_data['title'],
@@ -108,7 +140,7 @@ def process_batches(batches, mr_data, llm_client):
         )
         
         # 呼叫 LLM 審查
-        issues = llm_client.review_code(prompt)
+        issues = review_with_history(llm_client, prompt, batch, history, unparsed)
         
         if issues:
             all_issues.extend(issues)
@@ -119,13 +151,31 @@ def process_batches(batches, mr_data, llm_client):
     return all_issues
 
 
+def _echo_notes(notes):
+    """逐則顯示審查結果，再交給發佈流程"""
+    print("\n" + "=" * 80)
+    print("審查結果")
+    print("=" * 80)
+    for note in notes:
+        print(note)
+        print("=" * 80)
+        yield note
+
+
+def _print_superseded(error: RunSuperseded):
+    """輸出審查被新 commit 取代的訊息"""
+    print(f"\n⏭️ MR 已有新的 commit ({error.head_sha[:8]})，"
+          f"中止 {error.run_sha[:8]} 的審查，由最新的 pipeline 負責發佈。")
+
+
 def main():
     """主程式流程"""
     args = parse_args()
     skill_mode = bool(args.issues_file)
+    shard_mode = not skill_mode and NODE_TOTAL > 1
 
-    # Skill 模式不需要 AI_ACCESS_KEY
-    validate_config(skip_ai_key=skill_mode)
+    # Skill 模式與 dry run 不需要 AI_ACCESS_KEY
+    validate_config(skip_ai_key=skill_mode or args.plan)
 
     # 顯示設定資訊
     print("=" * 80)
@@ -133,55 +183,211 @@ def main():
     print("=" * 80)
     print(f"GitLab URL: {SERVER_URL}")
     print(f"Project ID: {PROJECT_ID}")
-    print(f"MR IID: {MR_IID}")
-    if skill_mode:
+    if not args.sweep:
+        print(f"MR IID: {MR_IID}")
+    if args.sweep:
+        print(f"模式: Sweep（專案中所有開啟中的 MR）")
+        print(f"AI Model: {AI_MODEL}")
+        print(f"LLM 並行數: {LLM_CONCURRENCY}")
+        print(f"Token 預算: {SWEEP_TOKEN_BUDGET or '不限制'}")
+    elif args.plan:
+        print(f"模式: Dry run（審查計畫）")
+        print(f"AI Model: {AI_MODEL}")
+    elif skill_mode:
         print(f"模式: Skill（Claude Code 預分析）")
-        print(f"Issues 檔案: {args.issues_file}")
+        print(f"Issues 檔案: {', '.join(args.issues_file)}")
     else:
         print(f"模式: 全流程（LLM 分析）")
-        print(f"LLM Provider: {get_provider_from_model(AI_MODEL)}")
+        if AI_BASE_URL:
+            print(f"LLM Provider: OpenAI 相容服務 ({AI_BASE_URL})")
+        else:
+            print(f"LLM Provider: {get_provider_from_model(AI_MODEL)}")
         print(f"AI Model: {AI_MODEL}")
+        if CASCADE_MODEL:
+            print(f"Cascade Model: {CASCADE_MODEL}（初篩）")
+        if shard_mode:
+            print(f"Shard: {NODE_INDEX}/{NODE_TOTAL}（結果寫入 {SHARD_DIR}）")
+        if PIPELINE_MODE:
+            print(f"Pipeline: 串流模式（LLM 並行數 {LLM_CONCURRENCY}）")
+        if LOW_MEMORY:
+            print("Low Memory: diff 暫存至磁碟，問題逐批寫出")
     print(f"Post Comment: {POST_COMMENT}")
     print("=" * 80)
 
-    # 獲取 MR metadata（兩種模式都需要 source_branch / project_path）
-    mr_data = get_mr_diff()
+    # 批次歷史：記錄每次呼叫的批次大小與結果，供 AUTO_BATCH_SIZE 調校
+    history = BatchHistory(BATCH_HISTORY_FILE) if BATCH_HISTORY_FILE else None
+    # 各 shard 必須以相同上限分批，分片模式不自動調校
+    auto_batch = AUTO_BATCH_SIZE and not shard_mode
+    if AUTO_BATCH_SIZE and shard_mode:
+        print("⚠️ 分片模式下停用 AUTO_BATCH_SIZE，使用靜態批次上限")
+
+    if args.sweep:
+        llm_client = MeteredClient(get_llm_client(
+            model=AI_MODEL, api_key=AI_ACCESS_KEY, base_url=AI_BASE_URL, api_mode=AI_API_MODE
+        ))
+        run_sweep(llm_client, LLM_CONCURRENCY, SWEEP_TOKEN_BUDGET, REVIEW_CACHE_DIR, PROJECT_ID,
+                  history=history, auto_batch=auto_batch)
+        return
+
+    if args.plan:
+        # Dry run：只分批與估算，不呼叫 LLM
+        mr_data = get_mr_diff_spooled(DiffSpool()) if LOW_MEMORY else get_mr_diff()
+        concurrency = args.plan_concurrency or (LLM_CONCURRENCY if PIPELINE_MODE else 1)
+        batch_limits = None
+        if auto_batch:
+            batch_limits = resolve_batch_limits(history, AI_MODEL, concurrency, mr_data['files'])
+        batches = create_batches(mr_data['files'], batch_limits)
+        plan = build_plan(batches, mr_data, AI_MODEL, concurrency, CASCADE_MODEL)
+        print_plan(plan)
+        if args.plan_output:
+            write_plan(args.plan_output, plan)
+        return
+
+    # 同一 MR 的多個 pipeline 只讓最新 commit 的執行審查與發佈
+    guard = None
+    if RUN_SHA and SUPERSEDE_CHECK:
+        guard = SupersedeGuard(RUN_SHA, SUPERSEDE_CHECK_INTERVAL)
+        if guard.is_superseded(force=True):
+            _print_superseded(RunSuperseded(guard.run_sha, guard.head_sha))
+            return
+        if POST_COMMENT and RUN_SHA in get_reviewed_shas():
+            print(f"⏭️ commit {RUN_SHA[:8]} 已有 AI 審查評論，略過此次審查。")
+            return
 
     if skill_mode:
+        # 獲取 MR metadata（需要 source_branch / project_path），不需下載 diff
+        mr_data = get_mr_info()
+
         # Skill 模式：直接載入 Claude Code 分析結果
-        with open(args.issues_file, encoding="utf-8") as f:
-            all_issues = json.load(f)
+        all_issues = load_issues_files(args.issues_file, IssueSpool() if LOW_MEMORY else None)
         print(f"✅ 載入 {len(all_issues)} 個預分析問題")
     else:
         # 全流程模式：用 LLM 分析
-        file_count = len(mr_data['files'])
-        print(f"✅ 成功獲取 MR diff ({file_count} 個符合檔案)")
+        llm_client = MeteredClient(get_llm_client(
+            model=AI_MODEL, api_key=AI_ACCESS_KEY, base_url=AI_BASE_URL, api_mode=AI_API_MODE
+        ))
+        triage_client = None
+        if CASCADE_MODEL:
+            triage_client = MeteredClient(get_llm_client(
+                model=CASCADE_MODEL, api_key=CASCADE_ACCESS_KEY, base_url=CASCADE_BASE_URL
+            ))
+
+        # 低記憶體模式：diff 暫存至磁碟並以 offset 參照，問題逐批寫入 JSONL
+        # （指定 --issues-output 時寫入該檔，而非暫存檔）
+        spool = DiffSpool() if LOW_MEMORY else None
+        all_issues = IssueSpool(args.issues_output or "") if LOW_MEMORY or args.issues_output else []
+
+        # 審查快取：與上次審查的 diff 對齊，沿用未變動 hunk 的問題
+        review_cache = ReviewCache.load(REVIEW_CACHE_DIR, PROJECT_ID, MR_IID) if REVIEW_CACHE_DIR else None
+
+        if PIPELINE_MODE:
+            # Pipeline 模式：先取 metadata，diff 分頁串流進入分批與 LLM workers
+            mr_data = get_mr_info()
+            # 串流模式在分批前不知道 diff 總量，以過去執行的 MR 大小估算
+            batch_limits = resolve_batch_limits(history, AI_MODEL, LLM_CONCURRENCY) if auto_batch else None
+            try:
+                result = run_pipeline(mr_data, llm_client, LLM_CONCURRENCY, triage_client, NODE_INDEX, NODE_TOTAL,
+                                      spool=spool, all_issues=all_issues, guard=guard,
+                                      review_cache=review_cache, batch_limits=batch_limits, history=history)
+            except RunSuperseded as e:
+                _print_superseded(e)
+                return
+            mr_data['files'] = result['files']
+            unparsed = result['unparsed']
+            file_count = result['matched']
+            escalated = result['escalated']
+            print(f"\n📦 共審查 {len(mr_data['files'])} 個符合檔案（{result['batches']} 個批次）")
+        else:
+            mr_data = get_mr_diff_spooled(spool) if LOW_MEMORY else get_mr_diff()
+            file_count = len(mr_data['files'])
+            print(f"✅ 成功獲取 MR diff ({file_count} 個符合檔案)")
+
+            if file_count == 0 and not shard_mode:
+                print(f"⚠️ 沒有找到符合模式的檔案 (FILE_PATTERN={FILE_PATTERN})，結束審查。")
+                return
+
+            reused_issues = []
+            if review_cache:
+                mr_data['files'] = review_cache.apply(mr_data['files'], reused_issues, spool)
+
+            batch_limits = resolve_batch_limits(history, AI_MODEL, 1, mr_data['files']) if auto_batch else None
+            batches = create_batches(mr_data['files'], batch_limits)
+            print(f"\n📦 已將 {len(mr_data['files'])} 個檔案分成 {len(batches)} 個批次處理")
+
+            if shard_mode:
+                all_batches = batches
+                batches = select_shard(all_batches, NODE_INDEX, NODE_TOTAL)
+                mr_data['files'] = [fd for batch in batches for fd in batch]
+                print(f"🧩 Shard {NODE_INDEX}/{NODE_TOTAL}: 負責 {len(batches)}/{len(all_batches)} 個批次")
+
+            if triage_client:
+                # Cascade 模式：先用便宜模型初篩，只將標記的檔案重新分批送深度審查
+                escalated = triage_batches(batches, mr_data, triage_client)
+                batches = create_batches(escalated, batch_limits)
+                print(f"\n📦 初篩後 {len(escalated)}/{len(mr_data['files'])} 個檔案需深度審查，分成 {len(batches)} 個批次")
+            unparsed = set()
+            try:
+                process_batches(batches, mr_data, llm_client, all_issues, guard, history, unparsed)
+            except RunSuperseded as e:
+                _print_superseded(e)
+                return
+            all_issues.extend(reused_issues)
+
+        # 記錄送審總量供 pipeline 模式估算 MR 大小；分片只審查部分批次、
+        # 全部沿用快取時沒有送審內容，都不列入
+        if history is not None and mr_data['files'] and not shard_mode:
+            history.record_run(AI_MODEL, mr_data['files'])
+
+        if triage_client:
+            print_cascade_report(mr_data, escalated, triage_client, llm_client)
+
+        if LOW_MEMORY:
+            spool.close()
+            rss = peak_rss_mb()
+            if rss is not None:
+                print(f"\n💾 低記憶體模式: 峰值 RSS {rss:.1f} MB")
+
+        if shard_mode:
+            # Shard 模式：只寫出結果，由合併 job 統一發佈評論
+            write_shard_file(shard_file_path(SHARD_DIR, NODE_INDEX, NODE_TOTAL),
+                             all_issues, mr_data['files'], NODE_INDEX, NODE_TOTAL)
+            return
 
         if file_count == 0:
             print(f"⚠️ 沒有找到符合模式的檔案 (FILE_PATTERN={FILE_PATTERN})，結束審查。")
             return
 
-        llm_client = get_llm_client(model=AI_MODEL, api_key=AI_ACCESS_KEY)
-        batches = create_batches(mr_data['files'])
-        print(f"\n📦 已將 {file_count} 個檔案分成 {len(batches)} 個批次處理")
-        all_issues = process_batches(batches, mr_data, llm_client)
+        # 分片模式由各 shard 自行載入快取，只有完整審查的執行才更新快取
+        if review_cache:
+            # 回應無法解析的檔案不寫入快取，避免下次被當成「已審查、無問題」而略過
+            review_cache.save(all_issues, RUN_SHA or mr_data.get("head_sha", ""), unparsed)
 
-    # 格式化輸出
+    # 發佈前再確認一次：MR 已被更新或同一 commit 已有其他執行發佈時不再重複留言
+    # （只是查詢而非鎖，同一 SHA 同時進行的執行仍可能各自發佈）
+    if guard:
+        if guard.is_superseded(force=True):
+            _print_superseded(RunSuperseded(guard.run_sha, guard.head_sha))
+            return
+        if POST_COMMENT and RUN_SHA in get_reviewed_shas():
+            print(f"⏭️ commit {RUN_SHA[:8]} 已由其他執行發佈審查評論，略過發佈。")
+            return
+
+    # 格式化輸出：依影響程度逐則產生，超過 GitLab 評論上限時分成多則
     project_path = mr_data.get('project_path', '')
     source_branch = mr_data['source_branch']
-    combined_review = format_review_output(all_issues, project_path, source_branch)
-
-    # 顯示結果
-    print("\n" + "=" * 80)
-    print("審查結果")
-    print("=" * 80)
-    print(combined_review)
-    print("=" * 80)
+    notes = _echo_notes(iter_review_notes(all_issues, project_path, source_branch, NOTE_BODY_LIMIT))
 
     # 發佈評論（含 @requester）
     requester_username = mr_data.get("requester_username", "")
     requester_id = mr_data.get("requester_id")
-    post_comment(combined_review, requester_username=requester_username)
+    if POST_COMMENT:
+        post_review_notes(notes, requester_username=requester_username,
+                          head_sha=RUN_SHA or mr_data.get("head_sha", ""))
+    else:
+        # 不發佈時仍逐則輸出
+        for _ in notes:
+            pass
+        print("⚠️ POST_COMMENT=false，僅在終端輸出結果。")
 
     # 將 assignee 改回 requester
     if requester_id:
@@ -0,0 +1,149 @@
+"""Sharded review across GitLab parallel jobs and merging of shard results"""
+
+import hashlib
+import json
+import os
+import sys
+
+
+def select_shard(batches: list, node_index: int, node_total: int) -> list:
+    """
+    挑選此 shard 負責的批次
+
+    create_batches 對同一份 diff 的結果是固定的，因此以批次序號輪流分配
+    （第 i 個批次交給 i % node_total），每個 job 都能獨立算出相同的分配且互不重疊。
+
+    Args:
+        batches: create_batches 產生的完整批次列表
+        node_index: 目前 job 的序號（GitLab CI_NODE_INDEX，從 1 開始）
+        node_total: job 總數（GitLab CI_NODE_TOTAL）
+
+    Returns:
+        list: 此 shard 要審查的批次
+    """
+    if node_total < 1 or not 1 <= node_index <= node_total:
+        print(f"❌ 無效的 shard 設定: CI_NODE_INDEX={node_index}, CI_NODE_TOTAL={node_total}")
+        sys.exit(1)
+    return batches[node_index - 1::node_total]
+
+
+def shard_file_path(shard_dir: str, node_index: int, node_total: int) -> str:
+    """回傳 shard 結果檔路徑"""
+    return os.path.join(shard_dir, f"shard-{node_index}-of-{node_total}.json")
+
+
+def write_shard_file(path: str, issues, files: list, node_index: int, node_total: int):
+    """
+    將此 shard 的審查結果寫入檔案，供合併階段讀取
+
+    問題逐一寫出（每行一個），issues 為 IssueSpool 時不需將所有問題讀回記憶體。
+
+    Args:
+        path: 輸出檔案路徑
+        issues: 此 shard 發現的問題（list 或 IssueSpool）
+        files: 此 shard 負責的檔案
+        node_index: 目前 job 的序號
+        node_total: job 總數
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{\n")
+        f.write(f'  "shard_index": {json.dumps(node_index)},\n')
+        f.write(f'  "shard_total": {json.dumps(node_total)},\n')
+        f.write(f'  "files": {json.dumps([fd["file_path"] for fd in files], ensure_ascii=False)},\n')
+        f.write('  "issues": [')
+        for issue in issues:
+            f.write(",\n    " if count else "\n    ")
+            f.write(json.dumps(issue, ensure_ascii=False))
+            count += 1
+        f.write("\n  ]\n}\n" if count else "]\n}\n")
+    print(f"✅ 已寫入 shard 結果: {path} ({count} 個問題)")
+
+
+def load_issues_files(paths: list, sink=None):
+    """
+    載入並合併一或多個 issues 檔案
+
+    支援 skill 模式的 JSON 陣列、每行一個問題的 JSONL（逐行串流讀取），
+    以及 write_shard_file 產生的 shard 檔案；格式依檔案內容判斷，與副檔名無關。
+    若 shard 檔案不齊全會提出警告。
+
+    Args:
+        paths: 檔案路徑列表
+        sink: 問題累積器（例如 IssueSpool），預設為新的 list
+
+    Returns:
+        list | IssueSpool: 合併後的問題（已移除完全重複的項目）
+    """
+    all_issues = sink if sink is not None else []
+    # 只保存雜湊做去重，不必保留每個問題的完整 JSON
+    seen = set()
+    shard_total = None
+    shard_indexes = set()
+
+    for path in paths:
+        if _is_jsonl(path):
+            issues = _iter_jsonl(path)
+        else:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+
+            if isinstance(data, dict):
+                shard_total = data.get("shard_total", shard_total)
+                shard_indexes.add(data.get("shard_index"))
+                issues = data.get("issues", [])
+            else:
+                issues = data
+
+        count = 0
+        for issue in issues:
+            count += 1
+            key = hashlib.sha1(json.dumps(issue, sort_keys=True, ensure_ascii=False).encode("utf-8")).digest()
+            if key in seen:
+                continue
+            seen.add(key)
+            all_issues.extend([issue])
+        print(f"  - {path}: {count} 個問題")
+
+    if shard_total:
+        missing = sorted(set(range(1, shard_total + 1)) - shard_indexes)
+        if missing:
+            print(f"⚠️ 缺少 shard 結果: {', '.join(str(i) for i in missing)} / {shard_total}，部分檔案未被審查")
+
+    return all_issues
+
+
+def _is_jsonl(path: str) -> bool:
+    """
+    依內容判斷檔案是否為 JSONL
+
+    第一個非空行本身就是一個完整的問題物件時視為 JSONL；JSON 陣列、多行排版的 JSON
+    或單行的 shard 結果檔（含 issues 欄位）則視為 JSON。空檔案視為沒有問題的 JSONL。
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if not line.startswith("{"):
+                return False
+            try:
+                first = json.loads(line)
+            except json.JSONDecodeError:
+                return False
+            return isinstance(first, dict) and "issues" not in first
+    return True
+
+
+def _iter_jsonl(path: str):
+    """逐行讀取 JSONL 檔案中的問題（略過空行）"""
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"❌ 無法解析 {path} 第 {line_no} 行: {e}")
+                sys.exit(1)
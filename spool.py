@@ -0,0 +1,153 @@
+"""Disk-backed storage for diffs and issues in low-memory mode"""
+
+import json
+import mmap
+import os
+import sys
+import tempfile
+import threading
+
+try:
+    import resource
+except ImportError:  # Windows 沒有 resource 模組
+    resource = None
+
+
+class SpooledFileInfo(dict):
+    """
+    只保存檔案路徑與大小的 file_info，diff 內容在讀取 ['diff'] 時才從 spool 取出
+
+    與一般 file_info 介面相同，分批、prompt 組裝等程式不需區分兩者。
+    """
+
+    def __init__(self, spool, file_path: str, offset: int, length: int, diff_chars: int):
+        super().__init__(file_path=file_path, diff_chars=diff_chars)
+        self._spool = spool
+        self._offset = offset
+        self._length = length
+
+    def __getitem__(self, key):
+        if key == "diff":
+            return self._spool.read(self._offset, self._length)
+        return super().__getitem__(key)
+
+
+class DiffSpool:
+    """
+    將 diff 寫入暫存檔，以 offset 參照並透過 mmap 讀取
+
+    pipeline 模式下 add 在下載 thread、read 在 event loop 中執行，
+    兩者共用檔案位置與大小，以同一個 lock 保護。
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        self._lock = threading.Lock()
+        self._size = 0
+        self._mmap = None
+        self._mapped_size = 0
+
+    def add(self, file_path: str, diff_text: str) -> SpooledFileInfo:
+        """
+        寫入一個檔案的 diff
+
+        Args:
+            file_path: 檔案路徑
+            diff_text: diff 內容
+
+        Returns:
+            SpooledFileInfo: 參照 spool 內容的 file_info
+        """
+        data = diff_text.encode("utf-8")
+        with self._lock:
+            offset = self._size
+            self._file.seek(offset)
+            self._file.write(data)
+            self._size += len(data)
+        return SpooledFileInfo(self, file_path, offset, len(data), len(diff_text))
+
+    def read(self, offset: int, length: int) -> str:
+        """讀取 spool 中的一段 diff"""
+        if length == 0:
+            return ""
+        with self._lock:
+            if offset + length > self._mapped_size:
+                self._remap()
+            return self._mmap[offset:offset + length].decode("utf-8")
+
+    def _remap(self):
+        """寫入新資料後重新建立 mmap（呼叫端需持有 lock）"""
+        self._file.flush()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._mmap = mmap.mmap(self._file.fileno(), self._size, access=mmap.ACCESS_READ)
+        self._mapped_size = self._size
+
+    def close(self):
+        """關閉並刪除暫存檔"""
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._file.close()
+
+
+class IssueSpool:
+    """
+    逐批寫入問題的 JSONL 檔案（issue sink）
+
+    提供 extend / len / iter，可取代 list 作為問題累積器。未指定路徑時寫入暫存檔；
+    指定路徑時問題一產生就串流寫入該檔，可在 skill 模式以 --issues-file 讀回。
+    """
+
+    def __init__(self, path: str = ""):
+        """
+        初始化 sink
+
+        Args:
+            path: 輸出的 JSONL 路徑，留空則使用暫存檔（關閉時刪除）
+        """
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._file = open(path, "w+", encoding="utf-8")
+        else:
+            self._file = tempfile.TemporaryFile("w+", encoding="utf-8")
+        self._count = 0
+
+    def extend(self, issues: list):
+        """追加問題（每批寫完即 flush，執行中斷時已寫入的問題仍保留在檔案中）"""
+        for issue in issues:
+            self._file.write(json.dumps(issue, ensure_ascii=False) + "\n")
+            self._count += 1
+        self._file.flush()
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        self._file.flush()
+        self._file.seek(0)
+        for line in self._file:
+            if line.strip():
+                yield json.loads(line)
+        self._file.seek(0, 2)
+
+    def close(self):
+        """關閉檔案（暫存檔會一併刪除）"""
+        self._file.close()
+
+
+def peak_rss_mb():
+    """
+    回傳目前程序的峰值常駐記憶體（MB）
+
+    Returns:
+        float | None: 峰值 RSS，平台不支援時回傳 None
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 單位為 KB，macOS 為 bytes
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
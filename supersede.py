@@ -0,0 +1,68 @@
+"""Detection of superseded review runs"""
+
+import threading
+import time
+
+from gitlab_client import get_mr_head_sha
+
+
+class RunSuperseded(Exception):
+    """MR 已有新的 commit，此次審查應中止"""
+
+    def __init__(self, run_sha: str, head_sha: str):
+        super().__init__(f"run sha {run_sha} superseded by {head_sha}")
+        self.run_sha = run_sha
+        self.head_sha = head_sha
+
+
+class SupersedeGuard:
+    """
+    檢查此次執行的 SHA 是否仍是 MR 的 head
+
+    檢查結果會快取 interval 秒，避免在批次之間頻繁呼叫 GitLab API；
+    一旦判定被取代就不再改變。
+    """
+
+    def __init__(self, run_sha: str, interval: int):
+        """
+        初始化檢查器
+
+        Args:
+            run_sha: 此次執行審查的 commit SHA
+            interval: 兩次實際查詢之間的最短秒數
+        """
+        self.run_sha = run_sha
+        self.interval = interval
+        self.head_sha = run_sha
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def is_superseded(self, force: bool = False) -> bool:
+        """
+        MR head 是否已不是此次執行的 SHA
+
+        Args:
+            force: 忽略快取，立即查詢
+
+        Returns:
+            bool: 已被新的 commit 取代時回傳 True
+        """
+        with self._lock:
+            if self.head_sha != self.run_sha:
+                return True
+            now = time.monotonic()
+            if not force and self._checked_at is not None and now - self._checked_at < self.interval:
+                return False
+            self._checked_at = now
+
+        # 查詢失敗時視為未被取代，繼續審查
+        head_sha = get_mr_head_sha()
+        if head_sha:
+            with self._lock:
+                self.head_sha = head_sha
+        return self.head_sha != self.run_sha
+
+    def check(self, force: bool = False):
+        """被取代時拋出 RunSuperseded"""
+        if self.is_superseded(force):
+            raise RunSuperseded(self.run_sha, self.head_sha)
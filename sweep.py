@@ -0,0 +1,223 @@
+"""Project-wide sweep: review all open MRs under a shared concurrency and token budget"""
+
+import asyncio
+import time
+
+import requests
+
+from batching import create_batches
+from formatter import iter_review_notes
+from gitlab_client import (
+    list_open_mrs,
+    get_mr_diff,
+    get_mr_head_sha,
+    get_reviewed_shas,
+    post_review_notes,
+    NOTE_BODY_LIMIT,
+)
+from llm import AsyncLLMClient
+from llm.pricing import estimate_tokens, format_cost
+from planner import OUTPUT_TOKENS_PER_FILE
+from prompts import build_review_prompt, build_batch_diff
+from reuse import ReviewCache
+from tuning import review_with_history, resolve_batch_limits
+
+# 批次審查失敗的標記（與「無問題」的空列表區分）
+_FAILED = object()
+
+
+class TokenBudget:
+    """
+    所有 MR 共用的 token 預算
+
+    以 MR 為單位預留預估用量：預留不到時先等進行中的 MR 結束（預留量改以實際用量計算）再試，
+    仍不足才整個略過（留給下次 sweep），不會只審查一半就發佈評論。
+    已用量取自 MeteredClient 的實際 token 統計。
+    """
+
+    def __init__(self, limit: int, metered_client):
+        """
+        初始化預算
+
+        Args:
+            limit: token 上限（輸入 + 輸出），0 表示不限制
+            metered_client: 提供實際用量的 MeteredClient
+        """
+        self.limit = limit
+        self.metered_client = metered_client
+        self.reserved = 0
+        self._changed = asyncio.Condition()
+
+    @property
+    def used(self) -> int:
+        """已實際使用的 tokens"""
+        return self.metered_client.input_tokens + self.metered_client.output_tokens
+
+    async def reserve(self, tokens: int) -> bool:
+        """預留 tokens；沒有進行中的預留且仍超出上限時回傳 False"""
+        async with self._changed:
+            while self.limit > 0 and self.used + self.reserved + tokens > self.limit:
+                if self.reserved == 0:
+                    return False
+                await self._changed.wait()
+            self.reserved += tokens
+            return True
+
+    async def release(self, tokens: int):
+        """MR 審查結束後釋放預留量（實際用量已計入 used）"""
+        async with self._changed:
+            self.reserved -= tokens
+            self._changed.notify_all()
+
+
+def run_sweep(llm_client, concurrency: int, token_budget: int = 0, cache_dir: str = "",
+              project_id: str = "", history=None, auto_batch: bool = False) -> dict:
+    """
+    審查專案中所有開啟中、且目前 head SHA 尚未審查過的 MR
+
+    所有 MR 的批次共用同一組 LLM 並行上限與 token 預算，
+    一個排程 job 即可消化整個專案的待審 MR。
+
+    Args:
+        llm_client: MeteredClient 包裝的同步 LLM 客戶端
+        concurrency: 所有 MR 合計同時進行的 LLM 呼叫數
+        token_budget: 此次 sweep 的 token 上限，0 表示不限制
+        cache_dir: REVIEW_CACHE_DIR，提供時沿用各 MR 上次審查的結果
+        project_id: 專案 ID（審查快取檔名用）
+        history: BatchHistory；提供時記錄每個批次的大小、耗時與解析結果
+        auto_batch: 依批次歷史為每個 MR 自動決定批次上限（AUTO_BATCH_SIZE）
+
+    Returns:
+        dict: 各狀態的 MR 數（reviewed、skipped、empty、budget、superseded、error）
+    """
+    return asyncio.run(_sweep(llm_client, concurrency, token_budget, cache_dir, project_id, history, auto_batch))
+
+
+async def _sweep(llm_client, concurrency, token_budget, cache_dir, project_id, history, auto_batch) -> dict:
+    started = time.monotonic()
+    mrs = await asyncio.to_thread(list_open_mrs)
+    print(f"✅ 找到 {len(mrs)} 個開啟中的 MR")
+
+    review_client = AsyncLLMClient(llm_client, concurrency)
+    budget = TokenBudget(token_budget, llm_client)
+    # 限制同時展開的 MR 數，避免一次下載所有 MR 的 diff
+    mr_slots = asyncio.Semaphore(concurrency)
+
+    async def review_one(mr):
+        async with mr_slots:
+            try:
+                return await _review_mr(mr, review_client, budget, cache_dir, project_id, history, auto_batch)
+            except (SystemExit, requests.RequestException):
+                # gitlab_client / LLM 客戶端在請求失敗時呼叫 sys.exit，逾時與連線錯誤則直接拋出；
+                # sweep 中只略過該 MR
+                print(f"❌ !{mr['iid']} 審查失敗，略過")
+                return "error"
+
+    statuses = await asyncio.gather(*(review_one(mr) for mr in mrs))
+
+    summary = {status: 0 for status in ("reviewed", "skipped", "empty", "budget", "superseded", "error")}
+    for status in statuses:
+        summary[status] += 1
+    _print_summary(summary, llm_client, budget, time.monotonic() - started)
+    return summary
+
+
+async def _review_mr(mr: dict, review_client, budget: TokenBudget, cache_dir: str, project_id: str,
+                     history, auto_batch: bool) -> str:
+    """審查單一 MR 並發佈評論，回傳狀態"""
+    mr_iid = mr['iid']
+    head_sha = mr.get('sha', '')
+
+    if head_sha in await asyncio.to_thread(get_reviewed_shas, mr_iid):
+        print(f"⏭️ !{mr_iid} commit {head_sha[:8]} 已審查過，略過")
+        return "skipped"
+
+    mr_data = await asyncio.to_thread(get_mr_diff, mr_iid)
+    all_issues = []
+    review_cache = ReviewCache.load(cache_dir, project_id, mr_iid) if cache_dir else None
+    files = mr_data['files']
+    if not files:
+        print(f"⏭️ !{mr_iid} 沒有符合模式的檔案，略過")
+        return "empty"
+    if review_cache:
+        files = review_cache.apply(files, all_issues)
+
+    limits = None
+    if auto_batch:
+        limits = resolve_batch_limits(history, review_client.model, review_client.concurrency, files)
+    batches = create_batches(files, limits)
+    prompts = []
+    for batch in batches:
+        file_info, diff_content = build_batch_diff(batch)
+        prompts.append(build_review_prompt(mr_data['title'], mr_data['description'], file_info, diff_content))
+    estimated = sum(estimate_tokens(len(prompt)) for prompt in prompts) + OUTPUT_TOKENS_PER_FILE * len(files)
+
+    if not await budget.reserve(estimated):
+        print(f"💸 !{mr_iid} 預估需要 {estimated} tokens，超出剩餘預算，留待下次 sweep")
+        return "budget"
+
+    unparsed = set()
+    try:
+        print(f"\n[!{mr_iid}] 正在審查 {len(files)} 個檔案（{len(batches)} 個批次）: {mr_data['title']}")
+        results = await asyncio.gather(*(
+            _review_batch(review_client, prompt, batch, history, unparsed)
+            for prompt, batch in zip(prompts, batches)
+        ))
+    finally:
+        await budget.release(estimated)
+
+    if any(issues is _FAILED for issues in results):
+        print(f"❌ !{mr_iid} 有批次審查失敗，不發佈此次結果")
+        return "error"
+
+    # 沿用的問題排在此次審查結果之後，與單一 MR 模式一致
+    reused_issues, all_issues = all_issues, []
+    for issues in results:
+        all_issues.extend(issues or [])
+    all_issues.extend(reused_issues)
+    print(f"✅ [!{mr_iid}] 完成審查: 發現 {len(all_issues)} 個問題")
+
+    # 審查期間 MR 有新 commit 時不發佈，由下次 sweep 審查新的 head
+    current_sha = await asyncio.to_thread(get_mr_head_sha, mr_iid)
+    if current_sha and current_sha != head_sha:
+        print(f"⏭️ !{mr_iid} 已有新的 commit ({current_sha[:8]})，不發佈此次結果")
+        return "superseded"
+
+    if review_cache:
+        review_cache.save(all_issues, head_sha, unparsed)
+    if history is not None and files:
+        history.record_run(review_client.model, files)
+
+    notes = list(iter_review_notes(all_issues, mr_data.get('project_path', ''), mr_data['source_branch'],
+                                   NOTE_BODY_LIMIT))
+    print(f"\n{'=' * 80}\n!{mr_iid} 審查結果\n{'=' * 80}\n" + f"\n{'=' * 80}\n".join(notes))
+    await asyncio.to_thread(post_review_notes, notes, mr_data.get("requester_username", ""), head_sha, mr_iid)
+    return "reviewed"
+
+
+async def _review_batch(review_client, prompt: str, batch: list, history, unparsed: set):
+    """
+    審查一個批次，LLM 呼叫失敗時回傳 _FAILED
+
+    LLM 客戶端在 API 失敗時呼叫 sys.exit，逾時與連線錯誤則拋出 requests.RequestException；
+    例外若離開 gather 的子 task 會中止整個 sweep，因此必須在每個批次的 coroutine 內攔截。
+    """
+    try:
+        return await review_client.call(review_with_history, review_client.client, prompt, batch, history,
+                                        unparsed)
+    except (SystemExit, requests.RequestException):
+        return _FAILED
+
+
+def _print_summary(summary: dict, llm_client, budget: TokenBudget, elapsed: float):
+    """輸出 sweep 統計"""
+    print("\n" + "=" * 80)
+    print("Sweep 結果")
+    print("=" * 80)
+    print(f"已審查: {summary['reviewed']}，已審查過略過: {summary['skipped']}，"
+          f"無符合檔案: {summary['empty']}")
+    print(f"超出預算: {summary['budget']}，審查中被更新: {summary['superseded']}，失敗: {summary['error']}")
+    budget_text = f" / 預算 {budget.limit}" if budget.limit > 0 else ""
+    print(f"LLM 呼叫: {llm_client.calls}，Tokens: {budget.used}{budget_text}，"
+          f"成本: {format_cost(llm_client.cost)}，總耗時 {elapsed:.1f}s")
+    print("=" * 80)
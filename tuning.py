@@ -0,0 +1,300 @@
+"""Batch history store and self-tuning of batch limits"""
+
+import json
+import math
+import os
+import statistics
+import threading
+import time
+
+from config import MAX_BATCH_CHARS, MAX_BATCH_FILES
+from batching import diff_size_of
+
+# 只採用每個模型最近的紀錄，讓調校跟著模型與服務狀態變化
+MAX_HISTORY_RECORDS = 500
+# 少於此筆數時不調校，使用靜態設定
+MIN_HISTORY_RECORDS = 8
+# 解析成功率低於此值的批次大小不列入候選
+MIN_PARSE_SUCCESS = 0.9
+# 單一檔案數區間至少要有這麼多筆紀錄才據以調整檔案數上限
+MIN_BUCKET_RECORDS = 3
+# 估算 MR 大小時只採用最近幾次執行的送審總量
+MAX_RUN_RECORDS = 50
+# 候選的批次字元上限
+CANDIDATE_BATCH_CHARS = (10000, 15000, 20000, 30000, 40000, 60000, 80000, 120000)
+
+
+class BatchHistory:
+    """
+    以 JSONL 記錄每個批次的大小、耗時、輸出 tokens 與解析結果
+
+    每次 LLM 呼叫追加一行，多個 worker 同時寫入時以 lock 保護。
+    每次完整審查另追加一行 kind=run 的紀錄（送審 diff 總量），供 pipeline 模式在下載前估算 MR 大小。
+    """
+
+    def __init__(self, path: str):
+        """
+        初始化歷史紀錄
+
+        Args:
+            path: JSONL 檔案路徑（目錄不存在時自動建立）
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, model: str, batch: list, seconds: float, usage: dict, parsed: bool):
+        """
+        追加一個批次的紀錄
+
+        Args:
+            model: 審查模型
+            batch: 批次中的檔案
+            seconds: LLM 呼叫耗時
+            usage: token 用量（input_tokens / output_tokens）
+            parsed: 回應是否成功解析
+        """
+        self._append({
+            "ts": int(time.time()),
+            "model": model,
+            "files": len(batch),
+            "chars": sum(diff_size_of(fd) for fd in batch),
+            "seconds": round(seconds, 3),
+            "output_tokens": usage.get("output_tokens", 0),
+            "parsed": parsed,
+        })
+
+    def record_run(self, model: str, files: list):
+        """
+        追加一次完整審查的送審總量
+
+        Args:
+            model: 審查模型
+            files: 此次送審的檔案（已扣除沿用上次審查的部分，呼叫端需確認不為空）
+        """
+        self._append({
+            "ts": int(time.time()),
+            "kind": "run",
+            "model": model,
+            "files": len(files),
+            "chars": sum(diff_size_of(fd) for fd in files),
+        })
+
+    def load(self, model: str) -> list:
+        """
+        讀取指定模型最近的批次紀錄
+
+        Returns:
+            list: 紀錄（最多 MAX_HISTORY_RECORDS 筆），檔案不存在時為空
+        """
+        return [r for r in self._read(model) if r.get("kind") != "run"][-MAX_HISTORY_RECORDS:]
+
+    def load_runs(self, model: str) -> list:
+        """
+        讀取指定模型最近的執行紀錄
+
+        Returns:
+            list: kind=run 的紀錄（最多 MAX_RUN_RECORDS 筆），檔案不存在時為空
+        """
+        return [r for r in self._read(model) if r.get("kind") == "run"][-MAX_RUN_RECORDS:]
+
+    def _append(self, entry: dict):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def _read(self, model: str) -> list:
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if entry.get("model") == model:
+                    records.append(entry)
+        return records
+
+
+def review_with_history(llm_client, prompt: str, batch: list, history, unparsed: set = None) -> list:
+    """
+    呼叫 LLM 審查一個批次，並將結果寫入批次歷史
+
+    需在實際呼叫 LLM 的同一個 thread 中執行，才能讀到該次呼叫的 last_usage / last_parsed。
+
+    Args:
+        llm_client: 同步 LLM 客戶端
+        prompt: 審查 prompt
+        batch: 批次中的檔案
+        history: BatchHistory；None 則只呼叫 LLM
+        unparsed: 回應無法解析時加入此批次的檔案路徑（這些檔案不寫入審查快取）
+
+    Returns:
+        list: 問題列表
+    """
+    start = time.monotonic()
+    issues = llm_client.review_code(prompt)
+    if history is not None:
+        history.record(llm_client.model, batch, time.monotonic() - start,
+                       llm_client.last_usage, llm_client.last_parsed)
+    if unparsed is not None and not llm_client.last_parsed:
+        unparsed.update(fd['file_path'] for fd in batch)
+    return issues
+
+
+def fit_latency(records: list):
+    """
+    以最小平方法擬合 耗時 = 固定開銷 + 每字元耗時 × 字元數
+
+    Returns:
+        tuple | None: (overhead_seconds, seconds_per_char)，資料不足以擬合時回傳 None
+    """
+    points = [(r["chars"], r["seconds"]) for r in records if r.get("parsed")]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        # 所有批次大小相同時無法區分固定開銷，視為全部與字元數成正比
+        return 0.0, mean_y / mean_x if mean_x else 0.0
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+    slope = max(slope, 0.0)
+    return max(mean_y - slope * mean_x, 0.0), slope
+
+
+def parse_success_rate(records: list, max_chars: int) -> float:
+    """
+    估算批次上限為 max_chars 時的解析成功率
+
+    取字元數落在 (上一個候選值, max_chars] 的紀錄；該區間沒有紀錄時改用所有不超過 max_chars 的紀錄。
+    """
+    lower = max([c for c in CANDIDATE_BATCH_CHARS if c < max_chars], default=0)
+    bucket = [r for r in records if lower < r["chars"] <= max_chars]
+    if not bucket:
+        bucket = [r for r in records if r["chars"] <= max_chars]
+    if not bucket:
+        return 1.0
+    return sum(1 for r in bucket if r.get("parsed")) / len(bucket)
+
+
+def estimate_review_seconds(max_chars: int, latency: tuple, success: float, concurrency: int,
+                            total_chars: int) -> float:
+    """
+    估算以 max_chars 分批審查 total_chars 字元的總耗時
+
+    總耗時 = 批次數 ÷ 並行數（無條件進位）× 單批耗時；解析失敗的批次視為白費，耗時除以成功率。
+    """
+    overhead, per_char = latency
+    calls = max(1, math.ceil(total_chars / max_chars))
+    chars_per_call = total_chars / calls
+    rounds = math.ceil(calls / max(1, concurrency))
+    return rounds * (overhead + per_char * chars_per_call) / success
+
+
+def choose_batch_limits(records: list, concurrency: int, total_chars: int):
+    """
+    依歷史紀錄選出耗時最短的批次上限
+
+    只考慮不超過「已觀察到的最大批次再高一級」的候選值，避免外插到從未嘗試過的大小。
+    檔案數上限見 choose_max_files。
+
+    Args:
+        records: BatchHistory.load 的結果
+        concurrency: 同時進行的 LLM 呼叫數
+        total_chars: 此次 MR 的 diff 總字元數（或其估計值）
+
+    Returns:
+        dict | None: max_chars、max_files、seconds（預估耗時），資料不足時回傳 None
+    """
+    if len(records) < MIN_HISTORY_RECORDS:
+        return None
+    latency = fit_latency(records)
+    if latency is None:
+        return None
+
+    largest_seen = max(r["chars"] for r in records)
+    candidates = []
+    for max_chars in CANDIDATE_BATCH_CHARS:
+        candidates.append(max_chars)
+        if max_chars >= largest_seen:
+            break
+
+    best = None
+    for max_chars in candidates:
+        success = parse_success_rate(records, max_chars)
+        if success < MIN_PARSE_SUCCESS:
+            continue
+        seconds = estimate_review_seconds(max_chars, latency, success, concurrency, total_chars)
+        if best is None or seconds < best["seconds"]:
+            best = {"max_chars": max_chars, "seconds": seconds}
+    if best is None:
+        return None
+
+    # 只看不超過所選字元上限的批次，避免把過大批次的失敗歸咎於檔案數
+    best["max_files"] = choose_max_files([r for r in records if r["chars"] <= best["max_chars"]])
+    return best
+
+
+def choose_max_files(records: list) -> int:
+    """
+    依解析成功率決定檔案數上限
+
+    檔案越多輸出越長、越容易被截斷：找出最小的 n，使「恰好 n 個檔案的批次」成功率低於
+    MIN_PARSE_SUCCESS（至少 MIN_BUCKET_RECORDS 筆才採信），上限即為 n - 1；
+    沒有這種跡象時維持 MAX_BATCH_FILES。
+    """
+    largest_seen = max((r["files"] for r in records), default=0)
+    for n in range(1, largest_seen + 1):
+        bucket = [r for r in records if r["files"] == n]
+        if len(bucket) < MIN_BUCKET_RECORDS:
+            continue
+        if sum(1 for r in bucket if r.get("parsed")) / len(bucket) < MIN_PARSE_SUCCESS:
+            return max(1, min(n - 1, MAX_BATCH_FILES))
+    return MAX_BATCH_FILES
+
+
+def resolve_batch_limits(history, model: str, concurrency: int, files=None):
+    """
+    自動模式：依歷史紀錄決定此次執行的批次上限並輸出
+
+    Args:
+        history: BatchHistory；None 表示未設定 BATCH_HISTORY_FILE
+        model: 審查模型（AI_MODEL）
+        concurrency: 同時進行的 LLM 呼叫數
+        files: 此次要審查的檔案；None 表示尚未下載（pipeline 模式），
+               改以過去執行送審總量的中位數估算 MR 大小
+
+    Returns:
+        tuple | None: (max_chars, max_files)，None 表示使用靜態設定
+    """
+    static_text = f"MAX_BATCH_CHARS={MAX_BATCH_CHARS}, MAX_BATCH_FILES={MAX_BATCH_FILES}"
+    if history is None:
+        print(f"⚠️ AUTO_BATCH_SIZE 需要 BATCH_HISTORY_FILE，使用靜態批次上限（{static_text}）")
+        return None
+
+    if files is not None:
+        total_chars = sum(diff_size_of(fd) for fd in files)
+        size_text = ""
+    else:
+        runs = history.load_runs(model)
+        total_chars = int(statistics.median(r["chars"] for r in runs)) if runs else 0
+        if total_chars <= 0:
+            # 沒有總量時各候選的預估耗時相同，會無根據地選到最小的上限
+            print(f"🎛️ {model} 沒有執行紀錄可估算 MR 大小，使用靜態批次上限（{static_text}）")
+            return None
+        size_text = f"，以過去 {len(runs)} 次執行的中位數 {total_chars} 字元估算 MR 大小"
+
+    records = history.load(model)
+    chosen = choose_batch_limits(records, concurrency, total_chars)
+    if chosen is None:
+        print(f"🎛️ {model} 的批次歷史不足（{len(records)} 筆，至少需要 {MIN_HISTORY_RECORDS} 筆"
+              f"且解析成功率 ≥ {MIN_PARSE_SUCCESS:.0%}），使用靜態批次上限（{static_text}）")
+        return None
+
+    print(f"🎛️ 自動批次上限 ({model}): MAX_BATCH_CHARS={chosen['max_chars']}, "
+          f"MAX_BATCH_FILES={chosen['max_files']}（依 {len(records)} 筆紀錄，"
+          f"預估審查耗時 {chosen['seconds']:.1f}s{size_text}）")
+    return chosen["max_chars"], chosen["max_files"]